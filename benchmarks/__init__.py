@@ -0,0 +1,5 @@
+"""Benchmarks for disno's hot paths. Run them as modules from the root of
+the repository, so ``disno`` is importable without installing it::
+
+    python -m benchmarks.zlib_decoder
+"""
@@ -0,0 +1,111 @@
+"""Decode cost of the sample events in ``payloads/gateway_events.json``
+as JSON (through ``disno.http.utils.from_json``, so orjson when it's
+installed) against ETF, through disno's own decoder and through erlpack
+when that's installed.
+
+The ETF payloads are encoded the way the gateway sends them: map keys as
+atoms and snowflakes as integers.
+
+    python -m benchmarks.gateway_decode [--number N]
+"""
+
+import argparse
+import json
+import os
+import struct
+import timeit
+
+try:
+    import erlpack
+except ModuleNotFoundError:
+    erlpack = None
+
+from disno.http import utils
+from disno.websockets.etf import VERSION, MAP_EXT, LIST_EXT, NIL_EXT, SMALL_ATOM_UTF8_EXT, _encode, from_etf
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), "payloads", "gateway_events.json")
+SNOWFLAKE_LISTS = ("roles", "mention_roles")
+
+
+def _is_snowflake(key, value) -> bool:
+    return (key == "id" or key.endswith("_id")) and isinstance(value, str) and value.isdigit()
+
+
+def snowflakes_to_int(obj):
+    """The payload as the ETF gateway has it, snowflakes as ints."""
+    if isinstance(obj, dict):
+        out = {}
+        for key, value in obj.items():
+            if _is_snowflake(key, value):
+                value = int(value)
+            elif key in SNOWFLAKE_LISTS and isinstance(value, list):
+                value = [int(item) for item in value]
+            else:
+                value = snowflakes_to_int(value)
+            out[key] = value
+        return out
+    if isinstance(obj, list):
+        return [snowflakes_to_int(item) for item in obj]
+    return obj
+
+
+def _encode_term(obj, out: bytearray) -> None:
+    if isinstance(obj, dict):
+        out += struct.pack(">BI", MAP_EXT, len(obj))
+        for key, value in obj.items():
+            name = key.encode("utf-8")
+            out += struct.pack(">BB", SMALL_ATOM_UTF8_EXT, len(name))
+            out += name
+            _encode_term(value, out)
+    elif isinstance(obj, list):
+        if obj:
+            out += struct.pack(">BI", LIST_EXT, len(obj))
+            for item in obj:
+                _encode_term(item, out)
+        out.append(NIL_EXT)
+    else:
+        _encode(obj, out)
+
+
+def to_gateway_etf(obj) -> bytes:
+    out = bytearray([VERSION])
+    _encode_term(obj, out)
+    return bytes(out)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(PAYLOADS, encoding="utf-8") as fp:
+        events = json.load(fp)
+
+    decoders = [("json us", utils.from_json, False), ("etf us", from_etf, True)]
+    if erlpack is not None:
+        decoders.append(("erlpack us", erlpack.ErlangTermDecoder(encoding="utf-8").loads, True))
+
+    print(f"json: {utils.from_json.__module__}")
+    print(f"{'event':>22} {'json B':>7} {'etf B':>7}" + "".join(f" {name:>10}" for name, _, _ in decoders))
+    totals = [0.0] * len(decoders)
+    for event in events:
+        encoded_json = utils.to_json(event).encode("utf-8")
+        expected = snowflakes_to_int(event)
+        encoded_etf = to_gateway_etf(expected)
+
+        times = []
+        for index, (_, decode, etf) in enumerate(decoders):
+            data = encoded_etf if etf else encoded_json
+            assert decode(data) == (expected if etf else event)
+            best = min(timeit.repeat(lambda: decode(data), number=args.number, repeat=5))
+            times.append(best / args.number * 1e6)
+            totals[index] += times[-1]
+
+        name = event["t"] or f"op {event['op']}"
+        print(f"{name:>22} {len(encoded_json):7d} {len(encoded_etf):7d}" + "".join(f" {t:10.2f}" for t in times))
+
+    print(f"{'total':>22} {'':>7} {'':>7}" + "".join(f" {t:10.2f}" for t in totals))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Memory per cached member, plain dicts against the compact tables.
+
+Members are generated in the shape the gateway sends them in
+``GUILD_MEMBERS_CHUNK`` (nulls included), encoded to one JSON chunk and
+then decoded and cached, so the count includes what decoding leaves
+behind.
+
+    python -m benchmarks.member_cache [members]
+"""
+
+import gc
+import random
+import sys
+import tracemalloc
+
+from disno.http.utils import to_json, from_json
+from disno.impl.state import EntityCache
+
+GUILD_ID = 81384788765712384
+
+
+def make_member(rng: random.Random, index: int, roles: list) -> dict:
+    user_id = 100000000000000000 + rng.getrandbits(56)
+    username = f"user{index}_{rng.getrandbits(20):x}"
+    return {
+        "user": {
+            "id": str(user_id),
+            "username": username,
+            "global_name": username if rng.random() < 0.6 else None,
+            "discriminator": "0",
+            "avatar": f"{rng.getrandbits(128):032x}" if rng.random() < 0.7 else None,
+            "avatar_decoration_data": None,
+            "banner": None,
+            "accent_color": None,
+            "public_flags": rng.choice((0, 0, 0, 64, 128, 256)),
+            "bot": rng.random() < 0.01,
+        },
+        "nick": f"nick{index}" if rng.random() < 0.15 else None,
+        "avatar": None,
+        "banner": None,
+        "roles": rng.choice(roles),
+        "joined_at": "2021-%02d-%02dT%02d:%02d:%02d.%06d+00:00" % (
+            rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23),
+            rng.randint(0, 59), rng.randint(0, 59), rng.randint(0, 999999),
+        ),
+        "premium_since": None,
+        "deaf": False,
+        "mute": False,
+        "pending": False,
+        "flags": 0,
+        "communication_disabled_until": None,
+    }
+
+
+def make_chunk(count: int) -> bytes:
+    rng = random.Random(0)
+    role_ids = [str(GUILD_ID + i) for i in range(1, 40)]
+    roles = [[]] + [sorted(rng.sample(role_ids, rng.randint(1, 5))) for _ in range(30)]
+    members = [make_member(rng, i, roles) for i in range(count)]
+    return to_json({"guild_id": str(GUILD_ID), "members": members}).encode()
+
+
+def measure(chunk: bytes, compact: bool):
+    gc.collect()
+    tracemalloc.start()
+    cache = EntityCache(compact=compact)
+    cache.process("GUILD_MEMBERS_CHUNK", from_json(chunk))
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cache, size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    chunk = make_chunk(count)
+
+    for compact in (False, True):
+        cache, size = measure(chunk, compact)
+        name = "compact" if compact else "dicts"
+        print(f"{name:>8}: {size / count:7.0f} B/member ({size / 2 ** 20:.1f} MiB for {count})")
+        if compact:
+            members = cache.members[GUILD_ID]
+            print(f"{'':>8}  {len(members.extras)} members and {len(cache.users.extras)} users with extras")
+        del cache
+
+
+if __name__ == "__main__":
+    main()
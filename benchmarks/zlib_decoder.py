@@ -0,0 +1,84 @@
+"""Per-frame cost of inflating a zlib-stream gateway connection,
+:class:`ZlibStreamDecoder` against the buffer-and-slice loop it replaced.
+
+The sample events in ``payloads/gateway_events.json`` are compressed into
+one zlib stream the way the gateway does it (a sync flush after every
+message). With ``--split`` every message is also cut into frames of at
+most that many bytes, to time the path that gathers split messages.
+
+    python -m benchmarks.zlib_decoder [--rounds N] [--split BYTES]
+"""
+
+import argparse
+import json
+import os
+import time
+import zlib
+
+from disno.websockets.compression import ZlibStreamDecoder, ZLIB_SUFFIX
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), "payloads", "gateway_events.json")
+
+
+def make_frames(rounds: int, split: int = None):
+    with open(PAYLOADS, encoding="utf-8") as fp:
+        events = [json.dumps(event, separators=(",", ":")).encode() for event in json.load(fp)]
+
+    compressor = zlib.compressobj()
+    frames = []
+    messages = events * rounds
+    for _ in range(rounds):
+        for event in events:
+            data = compressor.compress(event) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if split is None:
+                frames.append(data)
+            else:
+                frames.extend(data[i:i + split] for i in range(0, len(data), split))
+    return frames, messages
+
+
+class SliceDecoder:
+    """The receive loop from before ZlibStreamDecoder: a new buffer per
+    message and a slice for every suffix check."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._inflator = zlib.decompressobj()
+
+    def feed(self, data):
+        self._buffer.extend(data)
+        if self._buffer[-4:] != ZLIB_SUFFIX:
+            return None
+        msg = self._inflator.decompress(self._buffer)
+        self._buffer = bytearray()
+        return msg
+
+
+def run(decoder, frames: list) -> float:
+    feed = decoder.feed
+    start = time.perf_counter()
+    for frame in frames:
+        feed(frame)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--split", type=int, default=None)
+    args = parser.parse_args()
+
+    frames, messages = make_frames(args.rounds, args.split)
+    # both have to come up with every message before either is timed
+    for name, factory in (("slice", SliceDecoder), ("decoder", ZlibStreamDecoder)):
+        got = [m for m in map(factory().feed, frames) if m is not None]
+        assert got == messages, f"{name} decoded {len(got)} of {len(messages)} messages wrong or not at all"
+
+    print(f"{len(frames)} frames, {len(messages)} messages, {sum(map(len, frames)) / 2 ** 20:.1f} MiB compressed")
+    for name, factory in (("slice", SliceDecoder), ("decoder", ZlibStreamDecoder)):
+        best = min(run(factory(), frames) for _ in range(5))
+        print(f"{name:>8}: {best / len(frames) * 1e6:6.2f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,3 +13,7 @@ Docs reference: https://discord.dev
 """
 
 from .client import HTTPClient
+from .errors import HTTPException, DeadlineExceeded
+from .enums import Priority
+from .cache import ResponseCache
+from .export import HistoryExporter
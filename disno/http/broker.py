@@ -0,0 +1,248 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import os
+import sys
+from typing import Dict
+
+from .enums import Priority
+from .errors import RateLimitBrokerError
+from .ratelimits import RateLimitStore, MemoryRateLimitStore
+from .utils import to_json, from_json
+
+__all__ = (
+    'RateLimitBroker',
+    'BrokerRateLimitStore',
+)
+
+
+class RateLimitBroker:
+    """Serves a :class:`MemoryRateLimitStore` over a unix socket so every
+    process on the node shares the same buckets and global budget.
+
+    Run it on its own with ``python -m disno.http.broker <path>`` and
+    give each :class:`Requester` a :class:`BrokerRateLimitStore` pointing
+    at the same path.
+
+    Messages are newline delimited JSON objects. Each request carries an
+    ``id`` that's echoed back in its reply, so one connection can have
+    many calls waiting (e.g. several ``acquire``) at once. A call that
+    fails gets an ``error`` in its reply instead of a ``result``.
+    """
+
+    def __init__(self, path: str, *, store: MemoryRateLimitStore = None):
+        self.path: str = path
+        self.store: MemoryRateLimitStore = store or MemoryRateLimitStore()
+        self.server = None
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def serve_forever(self) -> None:
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # tokens this client took and hasn't given back yet,
+        # given back for it if it goes away without releasing them
+        held: Dict[str, int] = {}
+        tasks = set()
+
+        async def call(line):
+            message = {}
+            try:
+                message = from_json(line)
+                reply = {"id": message["id"], "result": await dispatch(message)}
+            except Exception as exc:
+                reply = {"id": message.get("id"), "error": f"{type(exc).__name__}: {exc}"}
+            writer.write(to_json(reply).encode() + b"\n")
+
+        async def dispatch(message):
+            op = message["op"]
+            key = message.get("key")
+            result = None
+
+            if op == "resolve":
+                result = await self.store.resolve(key)
+            elif op == "alias":
+                await self.store.alias(key, message["bucket_key"])
+            elif op == "acquire":
+                result = await self.store.acquire(key, message["priority"])
+                held[key] = held.get(key, 0) + 1
+            elif op == "release":
+                if not held.get(key):
+                    # nothing to give back, e.g. released twice
+                    return None
+                held[key] -= 1
+                await self.store.release(key, refund=message["refund"])
+            elif op == "update":
+                await self.store.update(key, message["headers"])
+            elif op == "exhaust":
+                await self.store.exhaust(key, message["retry_after"])
+            elif op == "acquire_global":
+                await self.store.acquire_global(key, message["priority"])
+            elif op == "pause_global":
+                await self.store.pause_global(message["retry_after"])
+            else:
+                raise ValueError(f"unknown op {op!r}")
+            return result
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(call(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for key, count in held.items():
+                for _ in range(count):
+                    await self.store.release(key, refund=True)
+            writer.close()
+
+
+class BrokerRateLimitStore(RateLimitStore):
+    """A :class:`RateLimitStore` backed by a :class:`RateLimitBroker`."""
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.reader = None
+        self.writer = None
+        self._calls: Dict[int, asyncio.Future] = {}
+        self._next_id: int = 0
+        self._connect_lock = None
+        self._read_task = None
+
+    async def connect(self) -> None:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if self.writer is not None:
+                return
+            self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+            self._read_task = asyncio.ensure_future(self._read_loop())
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                message = from_json(line)
+                fut = self._calls.pop(message["id"], None)
+                if fut is None or fut.done():
+                    continue
+                if "error" in message:
+                    fut.set_exception(RateLimitBrokerError(message["error"]))
+                else:
+                    fut.set_result(message["result"])
+        finally:
+            self.writer = None
+            error = ConnectionResetError("lost connection to the rate limit broker")
+            calls, self._calls = self._calls, {}
+            for fut in calls.values():
+                if not fut.done():
+                    fut.set_exception(error)
+
+    async def _send(self, op: str, **kwargs) -> asyncio.Future:
+        if self.writer is None:
+            await self.connect()
+
+        self._next_id += 1
+        kwargs["id"] = self._next_id
+        kwargs["op"] = op
+
+        fut = asyncio.get_running_loop().create_future()
+        self._calls[self._next_id] = fut
+        self.writer.write(to_json(kwargs).encode() + b"\n")
+        return fut
+
+    async def _call(self, op: str, **kwargs):
+        return await (await self._send(op, **kwargs))
+
+    async def resolve(self, key: str) -> str:
+        return await self._call("resolve", key=key)
+
+    async def alias(self, key: str, bucket_key: str) -> None:
+        await self._call("alias", key=key, bucket_key=bucket_key)
+
+    async def acquire(self, key: str, priority: int = Priority.user) -> bool:
+        fut = await self._send("acquire", key=key, priority=int(priority))
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # the broker will still hand us the token, give it straight back
+            def give_back(f):
+                if not f.cancelled() and f.exception() is None:
+                    asyncio.ensure_future(self.release(key, refund=True))
+
+            fut.add_done_callback(give_back)
+            raise
+
+    async def release(self, key: str, *, refund: bool = False) -> None:
+        await self._call("release", key=key, refund=refund)
+
+    async def update(self, key: str, headers) -> None:
+        headers = {k.lower(): v for k, v in headers.items() if k.lower().startswith("x-ratelimit")}
+        await self._call("update", key=key, headers=headers)
+
+    async def exhaust(self, key: str, retry_after: float) -> None:
+        await self._call("exhaust", key=key, retry_after=retry_after)
+
+    async def acquire_global(self, key: str = None, priority: int = Priority.user) -> None:
+        await self._call("acquire_global", key=key, priority=int(priority))
+
+    async def pause_global(self, retry_after: float) -> None:
+        await self._call("pause_global", retry_after=retry_after)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python -m disno.http.broker <socket path>")
+        sys.exit(1)
+
+    asyncio.run(RateLimitBroker(sys.argv[1]).serve_forever())
@@ -0,0 +1,213 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from .route import Route
+from .utils import to_json, MISSING
+
+__all__ = (
+    'ResponseCache',
+)
+
+# route templates worth caching and for how long, in seconds
+DEFAULT_TTLS = {
+    '/guilds/{guild_id}': 60.0,
+    '/guilds/{guild_id}/preview': 300.0,
+    '/guilds/{guild_id}/roles': 60.0,
+    '/guilds/{guild_id}/channels': 60.0,
+    '/guilds/{guild_id}/emojis': 300.0,
+    '/guilds/{guild_id}/stickers': 300.0,
+    '/guilds/{guild_id}/regions': 3600.0,
+    '/channels/{channel_id}': 60.0,
+    '/users/{user_id}': 300.0,
+    '/voice/regions': 3600.0,
+    '/sticker-packs': 3600.0,
+    '/stickers/{sticker_id}': 3600.0,
+}
+
+# writes that make cached responses on unrelated paths stale. The
+# templates are filled from the write's route params and then from the
+# fields of its response body, e.g. the guild_id of an edited channel
+RELATED_PATHS = {
+    '/channels/{channel_id}': ('/guilds/{guild_id}/channels',),
+    '/users/@me': ('/users/{id}',),
+}
+
+
+def _ancestors(path: str) -> Iterator[str]:
+    index = path.rfind('/')
+    while index > 0:
+        path = path[:index]
+        yield path
+        index = path.rfind('/')
+
+
+class ResponseCache:
+    """A TTL + LRU cache for the responses of read-only routes.
+
+    Only GET routes whose template has a TTL are cached. Writes to a route
+    invalidate every cached response on the same path or any path above or
+    below it, e.g. ``PATCH /guilds/1/roles/2`` drops both
+    ``/guilds/1/roles`` and ``/guilds/1``. Writes listed in
+    ``RELATED_PATHS`` also drop the paths they affect elsewhere, e.g.
+    ``PATCH /channels/2`` drops ``/guilds/1/channels``.
+
+    The size of an entry is estimated from its JSON encoding, and the
+    least recently used entries are evicted once ``max_size`` bytes are
+    in use.
+
+    Cached payloads are shared between callers, don't mutate them.
+    """
+
+    def __init__(self, *, ttls: Dict[str, float] = None, max_size: int = 16 * 1024 * 1024):
+        self.ttls: Dict[str, float] = dict(DEFAULT_TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+
+        self.max_size: int = max_size
+        self.size: int = 0
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.invalidations: int = 0
+
+        # key -> (path, expires_at, size, data)
+        self._entries: Dict[tuple, Tuple[str, float, int, Any]] = OrderedDict()
+        # path -> keys cached on it, and path -> cached paths below it,
+        # so invalidating doesn't have to scan every entry
+        self._by_path: Dict[str, Set[tuple]] = {}
+        self._below: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"<ResponseCache entries={len(self)} size={self.size} hits={self.hits} misses={self.misses}>"
+
+    @staticmethod
+    def make_key(route: Route, params: Optional[dict]) -> tuple:
+        return (route.url, tuple(sorted(params.items())) if params else ())
+
+    def cacheable(self, route: Route) -> bool:
+        return route.method == "GET" and route.raw_path in self.ttls
+
+    def get(self, route: Route, params: Optional[dict] = None):
+        """Returns the cached response or ``MISSING``."""
+        if not self.cacheable(route):
+            return MISSING
+
+        key = self.make_key(route, params)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        if entry[1] <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[3]
+
+    def set(self, route: Route, params: Optional[dict], data) -> None:
+        if not self.cacheable(route):
+            return
+
+        key = self.make_key(route, params)
+        if key in self._entries:
+            self._remove(key)
+
+        size = len(to_json(data))
+        if size > self.max_size:
+            return
+
+        path = route.path.rstrip('/')
+        expires_at = time.monotonic() + self.ttls[route.raw_path]
+        self._entries[key] = (path, expires_at, size, data)
+        self.size += size
+
+        keys = self._by_path.get(path)
+        if keys is None:
+            keys = self._by_path[path] = set()
+            for ancestor in _ancestors(path):
+                self._below.setdefault(ancestor, set()).add(path)
+        keys.add(key)
+
+        while self.size > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, route: Route, data=None) -> None:
+        """Drops the responses a write to ``route`` may have made stale.
+
+        ``data`` is the write's response body, used to fill in the
+        ``RELATED_PATHS`` of the route.
+        """
+        path = route.path.rstrip('/')
+
+        paths = {path}
+        paths.update(_ancestors(path))
+        paths.update(self._below.get(path, ()))
+
+        fields = dict(data) if isinstance(data, dict) else {}
+        fields.update(route.params)
+        for template in RELATED_PATHS.get(route.raw_path.rstrip('/'), ()):
+            try:
+                paths.add(template.format_map(fields))
+            except KeyError:
+                pass
+
+        stale = 0
+        for stale_path in paths:
+            for key in list(self._by_path.get(stale_path, ())):
+                self._remove(key)
+                stale += 1
+        self.invalidations += stale
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_path.clear()
+        self._below.clear()
+        self.size = 0
+
+    def _remove(self, key: tuple) -> None:
+        path, _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+        keys = self._by_path[path]
+        keys.discard(key)
+        if not keys:
+            del self._by_path[path]
+            for ancestor in _ancestors(path):
+                below = self._below[ancestor]
+                below.discard(path)
+                if not below:
+                    del self._below[ancestor]
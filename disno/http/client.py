@@ -25,10 +25,16 @@ SOFTWARE.
 import asyncio
 import aiohttp
 import sys
-from typing import Dict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
 
 from . import utils
-from .enums import AuthType
+from .utils import MISSING
+from .enums import AuthType, Priority
+from .errors import HTTPException, DeadlineExceeded
+from .cache import ResponseCache
+from .ratelimits import RateLimitStore, MemoryRateLimitStore
 from .route import Route
 from .endpoints import *
 
@@ -49,37 +55,100 @@ endpoints = (
     VoiceEndpoints,
 )
 
-class AutoUnlocker:
-    def __init__(self, lock):
-        self.lock = lock
+_priority_override: ContextVar[Optional[Priority]] = ContextVar('priority_override', default=None)
+_deadline_override: ContextVar[Optional[float]] = ContextVar('deadline_override', default=None)
 
-    def __enter__(self):
-        return self
 
-    def __exit__(
-        self,
-        exc_type,
-        exc,
-        traceback
-    ) -> None:
-        if self.lock.locked():
-            self.lock.release()
+async def _wait_until(aw, deadline: Optional[float]):
+    if deadline is None:
+        return await aw
+
+    timeout = deadline - asyncio.get_running_loop().time()
+    if timeout <= 0:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        raise DeadlineExceeded()
+
+    try:
+        return await asyncio.wait_for(aw, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded() from None
+
+
+class _SharedRequest:
+    """A GET that every caller asking for the same thing waits on."""
+
+    __slots__ = ('future', 'priority', 'waiters')
+
+    def __init__(self, future: asyncio.Future, priority: Priority):
+        self.future: asyncio.Future = future
+        self.priority: Priority = priority
+        self.waiters: int = 0
+
 
 class Requester:
-    def __init__(self, session: aiohttp.ClientSession, client_id: str = None, client_secret: str = None, bot_token: str = None):
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        client_id: str = None,
+        client_secret: str = None,
+        bot_token: str = None,
+        ratelimit_store: RateLimitStore = None,
+        response_cache: ResponseCache = None,
+        entity_cache = None,
+    ):
         self.client_id: int = client_id
         self.client_secret: str = client_secret
         self.bot_token: str = bot_token
-        self.ratelimit_locks: Dict[str, asyncio.Lock] = {}
-        self.buckets: Dict[str, Route] = {}
-        self.global_lock: asyncio.Event = asyncio.Event()
-        self.global_lock.set()
+        self.ratelimit_store: RateLimitStore = ratelimit_store or MemoryRateLimitStore()
+        self.response_cache: Optional[ResponseCache] = response_cache
+        # anything with lookup(route, params), see disno.impl.EntityCache
+        self.entity_cache = entity_cache
+        self._inflight: Dict[tuple, _SharedRequest] = {}
+        self.avoided_429s: int = 0
+        self.received_429s: int = 0
 
         user_agent = 'DiscordBot (https://github.com/QwireDev/disno {0}) Python/{1[0]}.{1[1]} aiohttp/{2}'
         self.user_agent: str = user_agent.format("1.0.0a1", sys.version_info, aiohttp.__version__)
 
         self.session: aiohttp.ClientSession = session
 
+    @contextmanager
+    def prioritize(self, priority: Priority):
+        """Sends every request made inside the block with ``priority``,
+        overriding the endpoints' own defaults.
+
+        .. code-block:: python
+
+            with client.prioritize(Priority.background):
+                await client.get_guild_audit_logs(guild_id)
+        """
+        token = _priority_override.set(priority)
+        try:
+            yield
+        finally:
+            _priority_override.reset(token)
+
+    @contextmanager
+    def time_limit(self, timeout: float):
+        """Gives every request made inside the block at most ``timeout``
+        seconds, counting the time spent waiting on rate limits. Requests
+        that can't be sent in time raise :exc:`DeadlineExceeded` without
+        using up any rate limit.
+
+        An endpoint's own, stricter deadline still applies.
+        """
+        deadline = asyncio.get_running_loop().time() + timeout
+        current = _deadline_override.get()
+        if current is not None:
+            deadline = min(deadline, current)
+
+        token = _deadline_override.set(deadline)
+        try:
+            yield
+        finally:
+            _deadline_override.reset(token)
+
     def _prepare_form(self, payload, files):
         form = []
         attachments = []
@@ -112,6 +181,13 @@ class Requester:
             )
         return form_data
 
+    def _get_deadline(self, timeout):
+        deadline = _deadline_override.get()
+        if timeout is not None:
+            own_deadline = asyncio.get_running_loop().time() + timeout
+            deadline = own_deadline if deadline is None else min(deadline, own_deadline)
+        return deadline
+
     async def request(
         self,
         route,
@@ -121,16 +197,69 @@ class Requester:
         reason = None,
         auth = AuthType.bot,
         token = None,
+        priority = Priority.user,
+        timeout = None,
+    ):
+        if self.entity_cache is not None and auth is AuthType.bot:
+            cached = self.entity_cache.lookup(route, params)
+            if cached is not MISSING:
+                return cached
+
+        cache = self.response_cache
+        if cache is not None and auth is AuthType.bot:
+            cached = cache.get(route, params)
+            if cached is not MISSING:
+                return cached
+
+        override = _priority_override.get()
+        if override is not None:
+            priority = override
+        deadline = self._get_deadline(timeout)
+
+        if route.method != "GET" or payload is not None or data:
+            return await self._request(route, payload, params, data, reason, auth, token, priority, deadline)
+
+        # identical GETs that are already in flight share the one request,
+        # and so the same result (don't mutate it). The shared request has
+        # no deadline of its own, each caller only waits for as long as
+        # theirs allows. A caller more urgent than the request in flight
+        # doesn't queue behind it but starts one that later callers share
+        key = (route.url, tuple(sorted(params.items())) if params else (), auth, token)
+        shared = self._inflight.get(key)
+        if shared is None or priority < shared.priority:
+            fut = asyncio.ensure_future(self._request(route, payload, params, data, reason, auth, token, priority, None))
+            shared = self._inflight[key] = _SharedRequest(fut, priority)
+
+            def done(_, shared=shared):
+                if self._inflight.get(key) is shared:
+                    del self._inflight[key]
+            fut.add_done_callback(done)
+
+        shared.waiters += 1
+        try:
+            return await _wait_until(asyncio.shield(shared.future), deadline)
+        finally:
+            shared.waiters -= 1
+            if not shared.waiters and not shared.future.done():
+                # everyone waiting on it has given up
+                shared.future.cancel()
+
+    async def _request(
+        self,
+        route,
+        payload,
+        params,
+        data,
+        reason,
+        auth,
+        token,
+        priority,
+        deadline,
     ):
         to_pass = {}
         method = route.method
         url = route.url
-        bucket = self.buckets.get(route.bucket) or route.bucket
-
-        lock = self.ratelimit_locks.get(bucket, None)
-        if lock is None:
-            lock = asyncio.Lock()
-            self.ratelimit_locks[bucket] = lock
+        store = self.ratelimit_store
 
         headers = {
             "User-Agent": self.user_agent
@@ -157,50 +286,68 @@ class Requester:
 
         to_pass["headers"] = headers
 
-        if not self.global_lock.is_set():
-            await self.global_lock.wait()
+        for tries in range(5):
+            bucket_key = await store.resolve(route.bucket)
+            if await _wait_until(store.acquire(bucket_key, priority), deadline):
+                self.avoided_429s += 1
 
-        await lock.acquire()
-        with AutoUnlocker(lock):
-            for tries in range(5):
+            # once the request may have reached discord the token is
+            # spent, even if no response ever makes it back
+            sent = False
+            try:
+                await _wait_until(store.acquire_global(bucket_key, priority), deadline)
+                if deadline is not None:
+                    # the round trip gets whatever is left
+                    remaining = deadline - asyncio.get_running_loop().time()
+                    to_pass["timeout"] = aiohttp.ClientTimeout(total=remaining)
+
+                sent = True
                 async with self.session.request(method, url, **to_pass) as res:
-                    data = await res.json()
+                    data = await utils.json_or_text(res)
 
                     new_bucket = res.headers.get('x-ratelimit-bucket', None)
-                    if new_bucket and new_bucket != bucket:
-                        route._bucket = new_bucket
-                        self.buckets[bucket] = new_bucket
-                        if self.ratelimit_locks.get(bucket, None) is not None:
-                            self.ratelimit_locks.pop(bucket)
-                            self.ratelimit_locks[new_bucket] = lock
-
-                    remaining = res.headers.get("x-ratelimit-limit", None)
-                    if remaining == '0' and res.status != 429:
-                        delay = res.headers.get("x-ratelimit-reset-after")
-                        self.loop.call_later(delay, lock.release)
-
-                    if 300 > res.status >= 200:
+                    if new_bucket is not None:
+                        # routes that share a bucket hash share the same limits
+                        new_key = new_bucket + ":" + ":".join([str(i) for i in route.major_params.values()])
+                        if new_key != bucket_key:
+                            await store.alias(route.bucket, new_key)
+
+                    await store.update(bucket_key, res.headers)
+
+                    cache = self.response_cache
+                    if cache is not None:
+                        if method != "GET":
+                            cache.invalidate(route, data)
+                        elif 300 > res.status >= 200 and auth is AuthType.bot:
+                            cache.set(route, params, data)
+
+                    if res.status != 429:
                         return data
 
-                    if res.status == 429:
-                        if "via" not in res.headers:
-                            raise
-                        reset_after = res.headers.get("x-ratelimit-reset-after")
-                        is_global = data.get("global", False)
-
-                        if is_global:
-                            self.global_lock.clear()
+                    if "via" not in res.headers:
+                        # not from discord, most likely a cloudflare ban
+                        raise HTTPException(res.status, data)
 
-                        await asyncio.sleep(float(reset_after))
+                    self.received_429s += 1
+                    retry_after = float(data.get("retry_after", res.headers.get("x-ratelimit-reset-after", 0)))
 
-                        if is_global:
-                            self.global_lock.set()
+                    if data.get("global", False):
+                        await store.pause_global(retry_after)
+                    else:
+                        await store.exhaust(bucket_key, retry_after)
 
-                    return data
+                    if tries == 4:
+                        return data
+            except asyncio.TimeoutError as exc:
+                if deadline is None or isinstance(exc, DeadlineExceeded):
+                    raise
+                raise DeadlineExceeded() from exc
+            finally:
+                await store.release(bucket_key, refund=not sent)
 
 
 class WebhookClient(Requester, AuthenticationlessWebhookEndpoints):
-    def __init__(self, *, loop=None, session=None):
+    def __init__(self, *, loop=None, session=None, ratelimit_store=None, response_cache=None, entity_cache=None):
         if loop is None:
             try:
                 loop = asyncio.get_running_loop()
@@ -213,11 +360,11 @@ class WebhookClient(Requester, AuthenticationlessWebhookEndpoints):
         if session is None:
             session = aiohttp.ClientSession(loop=self.loop)
 
-        super().__init__(session, client_id=None, client_secret=None, bot_token=None)
+        super().__init__(session, client_id=None, client_secret=None, bot_token=None, ratelimit_store=ratelimit_store, response_cache=response_cache, entity_cache=entity_cache)
 
 
 class InteractionsClient(Requester, WebhookEndpoints, InteractionEndpoints):
-    def __init__(self, bot_token, *, loop=None, session=None):
+    def __init__(self, bot_token, *, loop=None, session=None, ratelimit_store=None, response_cache=None, entity_cache=None):
         if loop is None:
             try:
                 loop = asyncio.get_running_loop()
@@ -230,11 +377,11 @@ class InteractionsClient(Requester, WebhookEndpoints, InteractionEndpoints):
         if session is None:
             session = aiohttp.ClientSession(loop=self.loop)
 
-        super().__init__(session, client_id=None, client_secret=None, bot_token=bot_token)
+        super().__init__(session, client_id=None, client_secret=None, bot_token=bot_token, ratelimit_store=ratelimit_store, response_cache=response_cache, entity_cache=entity_cache)
 
 
 class HTTPClient(Requester, *endpoints):
-    def __init__(self, bot_token = None, client_id = None, client_secret = None, *, loop=None, session=None):
+    def __init__(self, bot_token = None, client_id = None, client_secret = None, *, loop=None, session=None, ratelimit_store=None, response_cache=None, entity_cache=None):
         if loop is None:
             try:
                 loop = asyncio.get_running_loop()
@@ -247,7 +394,11 @@ class HTTPClient(Requester, *endpoints):
         if session is None:
             session = aiohttp.ClientSession(loop=self.loop)
 
-        super().__init__(session, client_id=client_id, client_secret=client_secret, bot_token=bot_token)
+        super().__init__(session, client_id=client_id, client_secret=client_secret, bot_token=bot_token, ratelimit_store=ratelimit_store, response_cache=response_cache, entity_cache=entity_cache)
+
+    def get_bot_gateway(self):
+        r = Route("GET", "/gateway/bot")
+        return self.request(r)
 
     async def get_gateway(self, *, encoding: str = 'json', zlib: bool = True) -> str:
         data = await self.client.session.request("GET", "https://discord.com/api/v9/gateway")
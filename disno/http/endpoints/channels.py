@@ -26,6 +26,7 @@ from typing import List, Optional
 
 from ..route import Route
 from ..enums import AuthType
+from ..pagination import paginate
 from .. import utils
 
 MISSING = utils.MISSING
@@ -383,6 +384,20 @@ class ChannelEndpoints:
 
         return self.request(r, params=params)
 
+    def iter_public_archived_threads(self, channel_id: int, *, limit: int = None, before: str = None, prefetch: bool = True):
+        """Walks the archived threads, most recently archived first."""
+        return paginate(
+            lambda cursor, n: self.get_public_archived_threads(channel_id, limit=n, before=cursor),
+            page_size=100,
+            limit=limit,
+            cursor=before,
+            get_items=lambda page: page["threads"],
+            # threads are paged by the ISO8601 time they were archived at
+            get_cursor=lambda items, page: items[-1]["thread_metadata"]["archive_timestamp"],
+            has_more=lambda page: page.get("has_more", False),
+            prefetch=prefetch,
+        )
+
     def get_private_archived_threads(self, channel_id: int, *, limit: int = None, before: int = None):
         r = Route('GET', '/channels/{channel_id}/threads/archived/private', channel_id=channel_id)
         params = {}
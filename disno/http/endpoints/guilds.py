@@ -22,6 +22,8 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from ..enums import Priority
+from ..pagination import paginate, newest_first, oldest_first
 from ..route import Route
 from ..utils import bytes_to_base64_data, MISSING
 
@@ -183,7 +185,17 @@ class GuildEndpoints:
         if after is not None:
             params["after"] = after
 
-        return self.request(r, params=params)
+        return self.request(r, params=params, priority=Priority.background)
+
+    def iter_members(self, guild_id: int, *, limit: int = None, after: int = None, prefetch: bool = True):
+        return paginate(
+            lambda cursor, n: self.list_members(guild_id, limit=n, after=cursor),
+            page_size=1000,
+            limit=limit,
+            cursor=after,
+            get_cursor=lambda items, page: oldest_first(items, lambda member: member["user"]["id"]),
+            prefetch=prefetch,
+        )
 
     def search_members(self, guild_id: int, *, query: str, limit: int = None):
         r = Route("GET", "/guilds/{guild_id}/members/search", guild_id=guild_id)
@@ -288,9 +300,30 @@ class GuildEndpoints:
         r = Route("DELETE", "/guilds/{guild_id}/members/{user_id}", guild_id=guild_id, user_id=user_id)
         return self.request(r, reason=reason)
 
-    def get_guild_bans(self, guild_id: int):
+    def get_guild_bans(self, guild_id: int, *, limit: int = None, before: int = None, after: int = None):
         r = Route("GET", "/guilds/{guild_id}/bans", guild_id=guild_id)
-        return self.request(r)
+        params = {}
+
+        if limit is not None:
+            params["limit"] = limit
+
+        if before is not None:
+            params["before"] = before
+
+        if after is not None:
+            params["after"] = after
+
+        return self.request(r, params=params, priority=Priority.background)
+
+    def iter_guild_bans(self, guild_id: int, *, limit: int = None, after: int = None, prefetch: bool = True):
+        return paginate(
+            lambda cursor, n: self.get_guild_bans(guild_id, limit=n, after=cursor),
+            page_size=1000,
+            limit=limit,
+            cursor=after,
+            get_cursor=lambda items, page: oldest_first(items, lambda ban: ban["user"]["id"]),
+            prefetch=prefetch,
+        )
 
     def get_guild_ban(self, guild_id: int, user_id: int):
         r = Route("GET", "/guilds/{guild_id}/bans", guild_id=guild_id, user_id=user_id)
@@ -402,7 +435,7 @@ class GuildEndpoints:
         if include_roles is not None:
             params["include_roles"] = ",".join(str(role) for role in include_roles)
 
-        return self.request(r, params=params)
+        return self.request(r, params=params, priority=Priority.background)
 
     def begin_prune(
         self,
@@ -425,7 +458,7 @@ class GuildEndpoints:
         if include_roles is not None:
             payload["include_roles"] = include_roles
 
-        return self.request(r, params=payload, reason=reason)
+        return self.request(r, params=payload, reason=reason, priority=Priority.background)
 
     def get_integrations(self, guild_id: int):
         r = Route("GET", "/guilds/{guild_id}/integrations", guild_id=guild_id)
@@ -511,7 +544,34 @@ class GuildEndpoints:
         if before is not MISSING:
             params["before"] = before
 
-        return self.request(r, params=params)
+        return self.request(r, params=params, priority=Priority.background)
+
+    def iter_guild_audit_logs(
+        self,
+        guild_id: int,
+        *,
+        user_id: int = MISSING,
+        action_type: int = MISSING,
+        before: int = MISSING,
+        limit: int = None,
+        prefetch: bool = True,
+    ):
+        """Walks the audit log entries, newest first."""
+        return paginate(
+            lambda cursor, n: self.get_guild_audit_logs(
+                guild_id,
+                user_id=user_id,
+                action_type=action_type,
+                before=MISSING if cursor is None else cursor,
+                limit=n,
+            ),
+            page_size=100,
+            limit=limit,
+            cursor=None if before is MISSING else before,
+            get_items=lambda page: page["audit_log_entries"],
+            get_cursor=lambda items, page: newest_first(items),
+            prefetch=prefetch,
+        )
 
     def get_guild_emojis(self, guild_id: int):
         r = Route("GET", "/guilds/{guild_id}/emojis", guild_id=guild_id)
@@ -22,8 +22,14 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import time
+
+from ..enums import Priority
 from ..route import Route
-from ..utils import MISSING
+from ..utils import MISSING, snowflake_time
+
+# interactions have to be responded to within 3 seconds of being created
+INTERACTION_RESPONSE_WINDOW = 3.0
 
 
 class InteractionEndpoints:
@@ -33,14 +39,32 @@ class InteractionEndpoints:
         interaction_token: str,
         *,
         type: int,
-        data
+        data,
+        received_at: float = None
     ):
+        """``received_at`` is the :func:`time.monotonic` time the
+        interaction came in, the time of the call if not given. The
+        response fails with :exc:`DeadlineExceeded` rather than being
+        sent once the interaction's 3 second window is over."""
         r = Route("POST", "/interactions/{interaction_id}/{interaction_token}/callback", interaction_id=interaction_id, interaction_token=interaction_token)
         payload = {
             "type": type,
             "data": data
         }
-        return self.request(r, payload=payload)
+
+        now = time.monotonic()
+        if received_at is None:
+            received_at = now
+        # no point in spending rate limit on a response that's already too
+        # late. The window left by the snowflake goes by the host's clock,
+        # which may be off, so it's kept within 3 seconds of receipt; if it
+        # says the window was over before the interaction even arrived,
+        # that's the clock and the full window is used
+        left = snowflake_time(interaction_id) + INTERACTION_RESPONSE_WINDOW - time.time() + (now - received_at)
+        if left <= 0 or left > INTERACTION_RESPONSE_WINDOW:
+            left = INTERACTION_RESPONSE_WINDOW
+        timeout = received_at + left - now
+        return self.request(r, payload=payload, priority=Priority.interaction, timeout=timeout)
 
     def get_original_interaction_response(self, application_id: int, interaction_token: str):
         return self.get_webhook_message(webhook_id=application_id, webhook_token=interaction_token, message_id="@original")
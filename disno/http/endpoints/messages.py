@@ -24,6 +24,8 @@ SOFTWARE.
 
 from typing import List
 
+from ..enums import Priority
+from ..pagination import paginate, newest_first, oldest_first
 from ..route import Route
 from .. import utils
 
@@ -55,6 +57,37 @@ class MessageEndpoints:
 
         return self.request(r, params=params)
 
+    def iter_messages(
+        self,
+        channel_id: int,
+        *,
+        limit: int = None,
+        before: int = None,
+        after: int = None,
+        prefetch: bool = True,
+    ):
+        """Walks a channel's history, newest first, or oldest first
+        when ``after`` is given."""
+        if after is not None:
+            return paginate(
+                lambda cursor, n: self.get_messages(channel_id, limit=n, after=cursor),
+                page_size=100,
+                limit=limit,
+                cursor=after,
+                get_items=lambda page: page[::-1],
+                get_cursor=lambda items, page: oldest_first(items),
+                prefetch=prefetch,
+            )
+
+        return paginate(
+            lambda cursor, n: self.get_messages(channel_id, limit=n, before=cursor),
+            page_size=100,
+            limit=limit,
+            cursor=before,
+            get_cursor=lambda items, page: newest_first(items),
+            prefetch=prefetch,
+        )
+
     def get_message(self, channel_id: int, message_id: int):
         r = Route('GET', '/channels/{channel_id}/messages/{message_id}', channel_id=channel_id, message_id=message_id)
         return self.request(r)
@@ -130,7 +163,7 @@ class MessageEndpoints:
             "messages": messages,
         }
 
-        return self.request(r, payload=payload, reason=reason)
+        return self.request(r, payload=payload, reason=reason, priority=Priority.background)
 
     def crosspost_message(self, channel_id: int, message_id: int):
         r = Route('POST', '/channels/{channel_id}/messages/{message_id}/crosspost', channel_id=channel_id, message_id=message_id)
@@ -25,6 +25,7 @@ SOFTWARE.
 import datetime
 from typing import Optional
 
+from ..pagination import paginate, oldest_first
 from ..route import Route
 from ..utils import bytes_to_base64_data, MISSING
 
@@ -150,7 +151,7 @@ class ScheduledEventEndpoints:
         before: Optional[int] = None,
         after: Optional[int] = None
     ):
-        r = Route("GET", "/guilds/{guild_id}/scheduled-events/{event_id}", guild_id=guild_id, event_id=event_id)
+        r = Route("GET", "/guilds/{guild_id}/scheduled-events/{event_id}/users", guild_id=guild_id, event_id=event_id)
         params = {
             "limit": limit,
             "with_member": int(with_member),
@@ -163,3 +164,22 @@ class ScheduledEventEndpoints:
             params["after"] = after
 
         return self.request(r, params=params)
+
+    def iter_scheduled_event_users(
+        self,
+        guild_id: int,
+        event_id: int,
+        *,
+        limit: int = None,
+        with_member: bool = False,
+        after: int = None,
+        prefetch: bool = True,
+    ):
+        return paginate(
+            lambda cursor, n: self.get_scheduled_event_users(guild_id, event_id, limit=n, with_member=with_member, after=cursor),
+            page_size=100,
+            limit=limit,
+            cursor=after,
+            get_cursor=lambda items, page: oldest_first(items, lambda event_user: event_user["user"]["id"]),
+            prefetch=prefetch,
+        )
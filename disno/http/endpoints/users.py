@@ -24,6 +24,7 @@ SOFTWARE.
 
 from ..route import Route
 from ..enums import AuthType
+from ..pagination import paginate, oldest_first
 from .. import utils
 
 MISSING = utils.MISSING
@@ -55,7 +56,7 @@ class UserEndpoints:
         return self.request(r, params=params, auth=AuthType.bearer, token=token)
 
     def get_current_user_guilds(self, token: str, *, limit: int = 200, before: int = None, after: int = None):
-        r = Route('PATCH', '/users/@me/guilds')
+        r = Route('GET', '/users/@me/guilds')
         params = {
             "limit": limit
         }
@@ -68,6 +69,16 @@ class UserEndpoints:
 
         return self.request(r, params=params, auth=AuthType.bearer, token=token)
 
+    def iter_current_user_guilds(self, token: str, *, limit: int = None, after: int = None, prefetch: bool = True):
+        return paginate(
+            lambda cursor, n: self.get_current_user_guilds(token, limit=n, after=cursor),
+            page_size=200,
+            limit=limit,
+            cursor=after,
+            get_cursor=lambda items, page: oldest_first(items),
+            prefetch=prefetch,
+        )
+
     def get_current_user_guild_member(self, token: str, *, guild_id):
         r = Route('GET', '/users/@me/guilds/{guild_id}/member', guild_id=guild_id)
         return self.request(r, auth=AuthType.bearer, token=token)
@@ -1,6 +1,12 @@
-from enum import Enum
+from enum import Enum, IntEnum
 
 class AuthType(Enum):
     none = 0
     bot = 1
     bearer = 2
+
+class Priority(IntEnum):
+    """Lower values are granted rate limit slots first."""
+    interaction = 0
+    user = 1
+    background = 2
@@ -0,0 +1,58 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+
+__all__ = (
+    'HTTPException',
+    'DeadlineExceeded',
+    'RateLimitBrokerError',
+)
+
+
+class HTTPException(Exception):
+    """Raised when a request fails in a way that retrying won't fix."""
+
+    def __init__(self, status: int, data, message: str = None):
+        self.status = status
+        self.data = data
+        super().__init__(message or f"{status}: {data}")
+
+    def __reduce__(self):
+        # so it can be sent between processes
+        return type(self), (self.status, self.data, str(self))
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Raised when a request runs out of time, either before it could be
+    sent (in which case it didn't use up any rate limit) or while waiting
+    for the response."""
+
+    def __init__(self, message: str = "request deadline exceeded"):
+        super().__init__(message)
+
+
+class RateLimitBrokerError(Exception):
+    """Raised by a :class:`BrokerRateLimitStore` call that failed in the
+    rate limit broker."""
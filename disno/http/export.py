@@ -0,0 +1,170 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import os
+import shutil
+import time
+from typing import List
+
+from .enums import Priority
+from .utils import to_json, from_json, time_snowflake
+
+__all__ = (
+    'HistoryExporter',
+)
+
+
+class HistoryExporter:
+    """Exports a channel's whole history to an NDJSON file, oldest first.
+
+    The channel's snowflake range is split into ``segments`` slices that
+    are fetched at the same time, each into its own part file, so the
+    only limit on how many pages are in flight is the bucket itself.
+    Once every slice is done the parts are joined, in order, into
+    ``path``.
+
+    Progress is saved to ``path + '.checkpoint'`` after every page, so an
+    interrupted export picks up where it left off when run again with
+    the same arguments.
+
+    .. code-block:: python
+
+        await HistoryExporter(client, channel_id, "history.ndjson").run()
+    """
+
+    def __init__(
+        self,
+        http,
+        channel_id: int,
+        path: str,
+        *,
+        segments: int = 5,
+        after: int = None,
+        before: int = None,
+        priority: Priority = Priority.background,
+    ):
+        self.http = http
+        self.channel_id: int = int(channel_id)
+        self.path: str = path
+        self.checkpoint_path: str = path + ".checkpoint"
+        self.priority: Priority = priority
+
+        # nothing in a channel is older than the channel itself, but a
+        # forum post's starter message has the same id as the post
+        start = self.channel_id - 1 if after is None else int(after)
+        end = time_snowflake(time.time()) if before is None else int(before)
+        self.state: dict = self._load_checkpoint() or self._split(start, end, segments)
+
+    def _split(self, start: int, end: int, segments: int) -> dict:
+        step = max((end - start) // segments, 1)
+        bounds = [start + step * i for i in range(segments)] + [end]
+
+        return {
+            "channel_id": self.channel_id,
+            "segments": [
+                {
+                    # exclusive on both ends, like after/before
+                    "after": bounds[i] - (1 if i else 0),
+                    "before": bounds[i + 1],
+                    "offset": 0,
+                    "done": False,
+                }
+                for i in range(segments)
+            ],
+        }
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return None
+
+        with open(self.checkpoint_path, "rb") as fp:
+            state = from_json(fp.read())
+
+        if state["channel_id"] != self.channel_id:
+            raise ValueError(f"{self.checkpoint_path} is a checkpoint for another channel")
+        return state
+
+    def _save_checkpoint(self) -> None:
+        temp = self.checkpoint_path + ".tmp"
+        with open(temp, "w") as fp:
+            fp.write(to_json(self.state))
+        os.replace(temp, self.checkpoint_path)
+
+    def _part_path(self, index: int) -> str:
+        return f"{self.path}.part{index}"
+
+    @property
+    def exported(self) -> int:
+        """How many bytes of messages have been written so far."""
+        return sum(segment["offset"] for segment in self.state["segments"])
+
+    async def _export_segment(self, index: int) -> None:
+        segment = self.state["segments"][index]
+        if segment["done"]:
+            return
+
+        mode = "r+b" if os.path.exists(self._part_path(index)) else "wb"
+        with open(self._part_path(index), mode) as fp:
+            # anything after the last checkpoint may be a half written page
+            fp.seek(segment["offset"])
+            fp.truncate()
+
+            while not segment["done"]:
+                with self.http.prioritize(self.priority):
+                    page = await self.http.get_messages(self.channel_id, limit=100, after=segment["after"])
+
+                messages: List[dict] = [m for m in reversed(page) if int(m["id"]) < segment["before"]]
+                for message in messages:
+                    fp.write(to_json(message).encode("utf-8") + b"\n")
+                fp.flush()
+
+                if messages:
+                    segment["after"] = int(messages[-1]["id"])
+                # a short page, or one that ran into the next slice, is the last one
+                segment["done"] = len(page) < 100 or len(messages) < len(page)
+                segment["offset"] = fp.tell()
+                self._save_checkpoint()
+
+    async def run(self) -> str:
+        """Runs (or resumes) the export and returns the output path."""
+        tasks = [asyncio.ensure_future(self._export_segment(i)) for i in range(len(self.state["segments"]))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # the checkpoint has what the others got done
+            for task in tasks:
+                task.cancel()
+            raise
+
+        with open(self.path, "wb") as out:
+            for index in range(len(self.state["segments"])):
+                with open(self._part_path(index), "rb") as part:
+                    shutil.copyfileobj(part, out)
+
+        for index in range(len(self.state["segments"])):
+            os.remove(self._part_path(index))
+        os.remove(self.checkpoint_path)
+
+        return self.path
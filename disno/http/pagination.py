@@ -0,0 +1,107 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+__all__ = (
+    'paginate',
+    'newest_first',
+    'oldest_first',
+)
+
+
+def newest_first(items: List[dict], key: Callable[[dict], Any] = lambda item: item["id"]):
+    """Cursor for pages walked with ``before``: the oldest snowflake seen."""
+    return min(int(key(item)) for item in items)
+
+
+def oldest_first(items: List[dict], key: Callable[[dict], Any] = lambda item: item["id"]):
+    """Cursor for pages walked with ``after``: the newest snowflake seen."""
+    return max(int(key(item)) for item in items)
+
+
+async def paginate(
+    fetch: Callable[[Any, int], Awaitable[Any]],
+    *,
+    page_size: int,
+    limit: Optional[int] = None,
+    cursor: Any = None,
+    get_items: Callable[[Any], List[Any]] = lambda page: page,
+    get_cursor: Callable[[List[Any], Any], Any],
+    has_more: Callable[[Any], bool] = None,
+    prefetch: bool = True,
+) -> AsyncIterator[Any]:
+    """Lazily walks a paginated endpoint, yielding one item at a time.
+
+    ``fetch(cursor, page_limit)`` requests a single page, ``get_items``
+    pulls the items out of it (in the order they should be yielded) and
+    ``get_cursor(items, page)`` works out the cursor for the next page.
+    A page shorter than requested, or ``has_more(page)`` returning false,
+    ends the walk, as does reaching ``limit`` items.
+
+    With ``prefetch`` the next page is requested as soon as the current
+    one arrives, so it downloads while the caller works through the
+    current one. Breaking out of the loop cancels it.
+    """
+    remaining = limit
+    if remaining is not None and remaining <= 0:
+        return
+
+    def page_limit():
+        return page_size if remaining is None else min(page_size, remaining)
+
+    requested = page_limit()
+    task = asyncio.ensure_future(fetch(cursor, requested))
+
+    try:
+        while task is not None:
+            page = await task
+            task = None
+
+            items = get_items(page)
+            done = len(items) < requested or (has_more is not None and not has_more(page))
+
+            if remaining is not None:
+                items = items[:remaining]
+                remaining -= len(items)
+                done = done or remaining == 0
+
+            if not items:
+                return
+
+            if not done:
+                cursor = get_cursor(items, page)
+                requested = page_limit()
+                if prefetch:
+                    task = asyncio.ensure_future(fetch(cursor, requested))
+
+            for item in items:
+                yield item
+
+            if not done and not prefetch:
+                task = asyncio.ensure_future(fetch(cursor, requested))
+    finally:
+        if task is not None:
+            task.cancel()
@@ -0,0 +1,365 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .enums import Priority
+
+__all__ = (
+    'Bucket',
+    'GlobalLimit',
+    'RateLimitStore',
+    'MemoryRateLimitStore',
+)
+
+
+class Bucket:
+    """A single rate limit bucket.
+
+    Tracks the ``x-ratelimit-*`` headers of the routes that share it and
+    hands out one token per request. Up to ``remaining`` requests may be
+    in flight at once; callers only wait when the bucket is drained.
+
+    Until the first response comes back the limits are unknown, so only
+    one request is let through to discover them.
+    """
+
+    def __init__(self, key: str):
+        self.key: str = key
+        self.limit: int = 1
+        self.remaining: int = 1
+        self.reset_at: Optional[float] = None
+        self.unlimited: bool = False
+        self.in_flight: int = 0
+        self.avoided: int = 0
+        self.received: int = 0
+        # (priority, arrival, future), served lowest first
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+        self._reset_timer: Optional[asyncio.TimerHandle] = None
+        # set once a route turns out to share another bucket
+        self._merged_into: Optional['Bucket'] = None
+
+    def __repr__(self):
+        return f"<Bucket key={self.key!r} limit={self.limit} remaining={self.remaining} in_flight={self.in_flight} avoided={self.avoided} received={self.received}>"
+
+    def _reset_if_expired(self, now: float) -> None:
+        if self.reset_at is not None and now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = None
+
+    def _take(self) -> None:
+        if not self.unlimited:
+            self.remaining -= 1
+        self.in_flight += 1
+
+    def _wake(self) -> None:
+        # tokens are handed straight to the best waiters rather than
+        # letting them race for it, so priority and arrival order hold
+        while self._waiters and self.can_acquire():
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                self._take()
+                fut.set_result(None)
+        self._schedule_reset()
+
+    def _schedule_reset(self) -> None:
+        if self._reset_timer is not None:
+            self._reset_timer.cancel()
+            self._reset_timer = None
+
+        if self._waiters and self.reset_at is not None and not self.unlimited:
+            delay = max(self.reset_at - time.monotonic(), 0)
+            self._reset_timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def can_acquire(self) -> bool:
+        if self.unlimited:
+            return True
+        self._reset_if_expired(time.monotonic())
+        return self.remaining > 0
+
+    async def acquire(self, priority: int = Priority.user) -> bool:
+        """Takes a token, waiting for the bucket to reset if it's drained.
+
+        Returns whether the request had to be held back, i.e. whether
+        sending it right away would have been rate limited. Requests
+        queued behind the one discovering an unknown bucket's limits
+        don't count.
+        """
+        if not self._waiters and self.can_acquire():
+            self._take()
+            return False
+
+        # a bucket whose limits are still being discovered isn't
+        # holding anything back from a 429
+        held = self.reset_at is not None
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._arrivals), fut))
+        self._wake()
+
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # the token was handed over just as we got cancelled
+                self.release(refund=True)
+            raise
+
+        if held:
+            self.avoided += 1
+        return held
+
+    def release(self, *, refund: bool = False) -> None:
+        """Gives the token back. ``refund`` should be set when the request
+        never got a response, so the token was not actually spent."""
+        if self._merged_into is not None:
+            self._merged_into.release(refund=refund)
+            return
+        self.in_flight -= 1
+        if refund and not self.unlimited:
+            self.remaining = min(self.remaining + 1, self.limit)
+        self._wake()
+
+    def absorb(self, other: 'Bucket') -> None:
+        """Takes over the waiters and in flight requests of ``other``,
+        for when its routes turn out to share this bucket."""
+        if other is self:
+            return
+        if other._reset_timer is not None:
+            other._reset_timer.cancel()
+            other._reset_timer = None
+
+        # they keep their order, behind the ones already waiting here
+        for priority, _, fut in sorted(other._waiters, key=lambda w: w[:2]):
+            heapq.heappush(self._waiters, (priority, next(self._arrivals), fut))
+        other._waiters = []
+
+        self.in_flight += other.in_flight
+        other.in_flight = 0
+        other._merged_into = self
+        self._wake()
+
+    def update(self, headers) -> None:
+        """Updates the bucket from the headers of a response that
+        holds one of this bucket's tokens."""
+        limit = headers.get('x-ratelimit-limit')
+        if limit is None:
+            # routes without a rate limit don't send any headers
+            self.unlimited = True
+            self._wake()
+            return
+
+        self.unlimited = False
+        self.limit = int(limit)
+
+        remaining = int(headers.get('x-ratelimit-remaining', 0))
+        reset_after = float(headers.get('x-ratelimit-reset-after', 0))
+        reset_at = time.monotonic() + reset_after
+
+        # the other requests still in flight have already taken a token
+        # locally but haven't been counted by discord yet
+        remaining = max(remaining - (self.in_flight - 1), 0)
+
+        if self.reset_at is not None and reset_at <= self.reset_at + 0.01:
+            # same window, responses may arrive out of order
+            self.remaining = min(self.remaining, remaining)
+        else:
+            self.remaining = remaining
+        self.reset_at = reset_at
+
+        self._wake()
+
+    def exhaust(self, retry_after: float) -> None:
+        """Marks the bucket as drained for ``retry_after`` seconds after
+        a 429 was received on it."""
+        self.received += 1
+        self.remaining = 0
+        self.reset_at = time.monotonic() + retry_after
+        self._schedule_reset()
+
+
+class GlobalLimit:
+    """The global request budget shared by every bucket.
+
+    Paces requests to ``rate`` per ``per`` seconds using GCRA, letting
+    at most ``burst`` go out back to back. When requests have to wait,
+    higher priority ones go first, and within a priority they're granted
+    round-robin across the buckets they're for, so one busy bucket can't
+    starve the others. The whole budget can be paused when discord
+    returns a global 429.
+    """
+
+    def __init__(self, rate: int = 50, per: float = 1.0, *, burst: int = 5):
+        self.rate: int = rate
+        self.per: float = per
+        self.burst: int = burst
+        self.paused_until: float = 0.0
+        # theoretical arrival time of the next request
+        self._tat: float = 0.0
+        self._lanes: Dict[int, Dict[str, Deque[asyncio.Future]]] = {}
+        self._scheduler: Optional[asyncio.Task] = None
+
+    @property
+    def interval(self) -> float:
+        return self.per / self.rate
+
+    def _delay(self, now: float) -> float:
+        """How long until a request can go out, 0 if it can right now."""
+        tolerance = self.interval * (self.burst - 1)
+        ready_at = max(self._tat - tolerance, self.paused_until)
+        return max(ready_at - now, 0)
+
+    def _take(self, now: float) -> None:
+        self._tat = max(self._tat, now) + self.interval
+
+    async def acquire(self, key: str = None, priority: int = Priority.user) -> None:
+        now = time.monotonic()
+        if not self._lanes and self._delay(now) == 0:
+            self._take(now)
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        lane = self._lanes.setdefault(priority, OrderedDict())
+        lane.setdefault(key, deque()).append(fut)
+        if self._scheduler is None or self._scheduler.done():
+            self._scheduler = asyncio.ensure_future(self._schedule())
+
+        await fut
+
+    async def _schedule(self) -> None:
+        while self._lanes:
+            delay = self._delay(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            priority = min(self._lanes)
+            lane = self._lanes[priority]
+            key, waiters = lane.popitem(last=False)
+            while waiters:
+                fut = waiters.popleft()
+                if not fut.done():
+                    fut.set_result(None)
+                    self._take(time.monotonic())
+                    break
+
+            if waiters:
+                # back of the line for this bucket
+                lane[key] = waiters
+            elif not lane:
+                del self._lanes[priority]
+
+    def pause(self, retry_after: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+
+class RateLimitStore:
+    """Where a :class:`Requester` keeps its rate limit state.
+
+    The default :class:`MemoryRateLimitStore` keeps everything in the
+    current process. Subclasses can keep the state somewhere shared so
+    several processes using the same token respect the same limits,
+    see :class:`disno.http.broker.BrokerRateLimitStore`.
+
+    Buckets are addressed by key. ``resolve`` maps a route's bucket key
+    to the key discord told us it actually shares (see ``alias``).
+    """
+
+    async def resolve(self, key: str) -> str:
+        raise NotImplementedError()
+
+    async def alias(self, key: str, bucket_key: str) -> None:
+        raise NotImplementedError()
+
+    async def acquire(self, key: str, priority: int = Priority.user) -> bool:
+        raise NotImplementedError()
+
+    async def release(self, key: str, *, refund: bool = False) -> None:
+        raise NotImplementedError()
+
+    async def update(self, key: str, headers) -> None:
+        raise NotImplementedError()
+
+    async def exhaust(self, key: str, retry_after: float) -> None:
+        raise NotImplementedError()
+
+    async def acquire_global(self, key: str = None, priority: int = Priority.user) -> None:
+        raise NotImplementedError()
+
+    async def pause_global(self, retry_after: float) -> None:
+        raise NotImplementedError()
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    def __init__(self, *, global_rate: int = 50, global_burst: int = 5):
+        self.ratelimits: Dict[str, Bucket] = {}
+        self.buckets: Dict[str, str] = {}
+        self.global_limit: GlobalLimit = GlobalLimit(global_rate, burst=global_burst)
+
+    def get_bucket(self, key: str) -> Bucket:
+        bucket = self.ratelimits.get(key, None)
+        if bucket is None:
+            bucket = Bucket(key)
+            self.ratelimits[key] = bucket
+        return bucket
+
+    async def resolve(self, key: str) -> str:
+        return self.buckets.get(key) or key
+
+    async def alias(self, key: str, bucket_key: str) -> None:
+        self.buckets[key] = bucket_key
+        bucket = self.get_bucket(key)
+        shared = self.ratelimits.get(bucket_key)
+        if shared is None:
+            # keep the bucket that has been counting so far
+            self.ratelimits[bucket_key] = bucket
+        elif shared is not bucket:
+            # requests already waiting on or holding a token from the
+            # route's own bucket count against the shared one from now on
+            shared.absorb(bucket)
+            self.ratelimits[key] = shared
+
+    async def acquire(self, key: str, priority: int = Priority.user) -> bool:
+        return await self.get_bucket(key).acquire(priority)
+
+    async def release(self, key: str, *, refund: bool = False) -> None:
+        self.get_bucket(key).release(refund=refund)
+
+    async def update(self, key: str, headers) -> None:
+        self.get_bucket(key).update(headers)
+
+    async def exhaust(self, key: str, retry_after: float) -> None:
+        self.get_bucket(key).exhaust(retry_after)
+
+    async def acquire_global(self, key: str = None, priority: int = Priority.user) -> None:
+        await self.global_limit.acquire(key, priority)
+
+    async def pause_global(self, retry_after: float) -> None:
+        self.global_limit.pause(retry_after)
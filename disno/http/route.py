@@ -7,6 +7,7 @@ class Route:
         self.method = method
         self.path = path
         self.raw_path = path
+        self.params = params
         if params:
             self.path = self.path.format_map({k: _quote(v) if isinstance(v, str) else v for k, v in params.items()})
         self.url = self.base + self.path
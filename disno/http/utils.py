@@ -37,6 +37,19 @@ except ModuleNotFoundError:
     from_json = json.loads
 
 
+DISCORD_EPOCH = 1420070400000
+
+
+def snowflake_time(snowflake: int) -> float:
+    """The unix timestamp, in seconds, a snowflake was created at."""
+    return ((int(snowflake) >> 22) + DISCORD_EPOCH) / 1000
+
+
+def time_snowflake(timestamp: float) -> int:
+    """The smallest snowflake created at the unix timestamp ``timestamp``."""
+    return (int(timestamp * 1000) - DISCORD_EPOCH) << 22
+
+
 class _MissingSentinel:
     def __eq__(self, other):
         return False
@@ -50,6 +63,13 @@ class _MissingSentinel:
 MISSING = _MissingSentinel()
 
 
+async def json_or_text(response):
+    text = await response.text(encoding='utf-8')
+    if response.headers.get('content-type', '').startswith('application/json'):
+        return from_json(text)
+    return text
+
+
 def get_mime_type_for_image(data: bytes):
     if data.startswith(b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A'):
         return 'image/png'
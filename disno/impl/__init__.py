@@ -23,3 +23,7 @@ SOFTWARE.
 """
 
 from .events import GatewayClient
+from .cluster import ClusterLauncher, ClusterBus
+from .dispatch import EventDispatcher
+from .state import EntityCache
+from .policy import CachePolicy, EntityPolicy
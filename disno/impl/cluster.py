@@ -0,0 +1,391 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from ..websockets import GatewayClosed, IdentifyLimiter
+from ..websockets.utils import to_json, from_json
+
+__all__ = (
+    'ClusterBus',
+    'ClusterLauncher',
+)
+
+# the hub itself, for requests the launcher answers
+HUB = -1
+# what a worker exits with when the gateway closed it for good (bad token,
+# disallowed intents...), so the launcher knows not to start it again
+FATAL_EXIT_CODE = 78
+
+
+def _encode(message: dict) -> bytes:
+    return to_json(message).encode() + b"\n"
+
+
+class ClusterBus:
+    """A worker's connection to the other clusters, through the hub the
+    :class:`ClusterLauncher` runs.
+
+    Handlers are registered per event name and receive the sending
+    cluster's id and the data. Whatever a handler returns is sent back
+    to clusters that used :meth:`request`.
+
+    .. code-block:: python
+
+        @client.bus.handler("guild_count")
+        async def guild_count(sender, data):
+            return len(my_guilds)
+
+        counts = await client.bus.request(2, "guild_count")
+    """
+
+    def __init__(self, path: str, cluster_id: int):
+        self.path: str = path
+        self.cluster_id: int = cluster_id
+        self.handlers: Dict[str, Callable] = {}
+        self.reader = None
+        self.writer = None
+        self._replies: Dict[int, asyncio.Future] = {}
+        self._nonce: int = 0
+        self._read_task = None
+
+    def handler(self, event: str = None):
+        def inner(func):
+            self.handlers[event or func.__name__] = func
+            return func
+        return inner
+
+    async def connect(self) -> None:
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+        self.writer.write(_encode({"op": "hello", "cluster": self.cluster_id}))
+        self._read_task = asyncio.ensure_future(self._read_loop())
+
+    async def close(self) -> None:
+        if self._read_task is not None:
+            self._read_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+    async def _read_loop(self) -> None:
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = from_json(line)
+
+            if message["op"] == "reply":
+                fut = self._replies.pop(message["nonce"], None)
+                if fut is not None and not fut.done():
+                    fut.set_result(message.get("data"))
+            elif message["op"] == "send":
+                asyncio.ensure_future(self._dispatch(message))
+
+    async def _dispatch(self, message: dict) -> None:
+        func = self.handlers.get(message["event"])
+        result = None
+        if func is not None:
+            result = await func(message["from"], message.get("data"))
+
+        if message.get("nonce") is not None:
+            self.writer.write(_encode({
+                "op": "reply",
+                "to": message["from"],
+                "nonce": message["nonce"],
+                "data": result,
+            }))
+
+    async def send(self, cluster_id, event: str, data = None) -> None:
+        """Sends an event to a cluster, or to every cluster with ``"*"``,
+        without waiting for an answer."""
+        self.writer.write(_encode({"op": "send", "to": cluster_id, "from": self.cluster_id, "event": event, "data": data}))
+        await self.writer.drain()
+
+    async def request(self, cluster_id, event: str, data = None, *, timeout: float = 10.0):
+        """Sends an event to a cluster and waits for its handler's result."""
+        self._nonce += 1
+        nonce = self._nonce
+        fut = asyncio.get_running_loop().create_future()
+        self._replies[nonce] = fut
+
+        self.writer.write(_encode({
+            "op": "send",
+            "to": cluster_id,
+            "from": self.cluster_id,
+            "event": event,
+            "data": data,
+            "nonce": nonce,
+        }))
+
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self._replies.pop(nonce, None)
+
+
+class _BusIdentifyLimiter:
+    # identifies have to be spaced out across every process, so the hub decides
+    def __init__(self, bus: ClusterBus):
+        self.bus = bus
+        self.max_concurrency: int = 1
+
+    async def wait(self, shard_id: int = None) -> None:
+        await self.bus.request(HUB, "identify", {"shard_id": shard_id, "max_concurrency": self.max_concurrency}, timeout=None)
+
+
+def _run_worker(factory, token, cluster_id, shard_ids, shard_count, path, sessions, core):
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    client = factory()
+    client.http.bot_token = token
+    client.cluster_id = cluster_id
+    client.bus = ClusterBus(path, cluster_id)
+
+    shards = client.shards
+    shards.shard_count = shard_count
+    shards.shard_ids = shard_ids
+    shards.resume_sessions = {int(shard_id): session for shard_id, session in sessions.items()}
+    shards.identify_limiter = _BusIdentifyLimiter(client.bus)
+
+    async def report_sessions():
+        # lets the launcher resume these shards if this process dies
+        while True:
+            await asyncio.sleep(5)
+            sessions = {str(shard_id): session for shard_id, session in shards.sessions.items()}
+            await client.bus.send(HUB, "sessions", sessions)
+
+    async def main():
+        await client.bus.connect()
+        reporter = asyncio.ensure_future(report_sessions())
+        try:
+            await client.start()
+        finally:
+            reporter.cancel()
+            await client.bus.close()
+
+    try:
+        loop.run_until_complete(main())
+    except GatewayClosed as exc:
+        print(f"[ERROR]     cluster {cluster_id}: {exc}")
+        sys.exit(FATAL_EXIT_CODE)
+
+
+class ClusterLauncher:
+    """Spreads a bot's shards over several worker processes.
+
+    ``factory`` is a module level function (it has to be picklable) that
+    builds the :class:`GatewayClient` for a worker, listeners and all.
+    Each worker's client gets ``cluster_id`` and a :class:`ClusterBus` as
+    ``client.bus`` for talking to the other workers.
+
+    Shards are split evenly over ``cluster_count`` workers (one per core
+    by default) unless ``clusters`` lists the shard ids for each one. With
+    ``pin`` each worker is pinned to its own core where the OS allows it.
+
+    The launcher supervises the workers: one that dies is started again,
+    with backoff if it keeps dying, and its shards resume the sessions it
+    last reported instead of identifying again. A worker the gateway shut
+    out for good (a bad token or disallowed intents) isn't restarted.
+
+    Workers talk to the launcher over a unix socket at ``ipc_path``, by
+    default in a directory of its own that only this user can open.
+
+    .. code-block:: python
+
+        def make_client():
+            client = GatewayClient()
+            client.listener()(message_create)
+            return client
+
+        if __name__ == "__main__":
+            ClusterLauncher(make_client, "token", shard_count=16).run()
+    """
+
+    def __init__(
+        self,
+        factory: Callable,
+        token: str,
+        *,
+        shard_count: int,
+        cluster_count: int = None,
+        clusters: List[List[int]] = None,
+        pin: bool = False,
+        ipc_path: str = None,
+    ):
+        self.factory = factory
+        self.token: str = token
+        self.shard_count: int = shard_count
+
+        if clusters is None:
+            cluster_count = cluster_count or os.cpu_count() or 1
+            clusters = [list(range(shard_count))[i::cluster_count] for i in range(cluster_count)]
+        self.clusters: List[List[int]] = [ids for ids in clusters if ids]
+
+        self.pin: bool = pin
+        self.ipc_path: Optional[str] = ipc_path
+        self._ipc_dir: Optional[str] = None
+
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.sessions: Dict[int, dict] = {}
+        self.restarts: Dict[int, int] = {}
+        self._writers: Dict[int, asyncio.StreamWriter] = {}
+        self._identify_limiter: Optional[IdentifyLimiter] = None
+        self._context = multiprocessing.get_context("spawn")
+        self._closing: bool = False
+        self._restarting: Dict[int, asyncio.Task] = {}
+
+    def _start_worker(self, cluster_id: int) -> None:
+        shard_ids = self.clusters[cluster_id]
+        sessions = {
+            shard_id: self.sessions[shard_id]
+            for shard_id in shard_ids if shard_id in self.sessions
+        }
+        core = cluster_id % (os.cpu_count() or 1) if self.pin else None
+
+        process = self._context.Process(
+            target=_run_worker,
+            args=(self.factory, self.token, cluster_id, shard_ids, self.shard_count, self.ipc_path, sessions, core),
+            daemon=True,
+        )
+        process.start()
+        self.processes[cluster_id] = process
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        cluster_id = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = from_json(line)
+                op = message["op"]
+
+                if op == "hello":
+                    cluster_id = message["cluster"]
+                    self._writers[cluster_id] = writer
+                elif message.get("to") == HUB:
+                    asyncio.ensure_future(self._hub_request(writer, message))
+                elif message.get("to") == "*":
+                    for other_id, other in self._writers.items():
+                        if other_id != cluster_id:
+                            other.write(line)
+                else:
+                    target = self._writers.get(message.get("to"))
+                    if target is not None:
+                        target.write(line)
+        finally:
+            if self._writers.get(cluster_id) is writer:
+                del self._writers[cluster_id]
+            writer.close()
+
+    async def _hub_request(self, writer: asyncio.StreamWriter, message: dict) -> None:
+        data = message.get("data") or {}
+
+        if message["event"] == "sessions":
+            for shard_id, session in data.items():
+                self.sessions[int(shard_id)] = session
+        elif message["event"] == "identify":
+            if self._identify_limiter is None:
+                self._identify_limiter = IdentifyLimiter(data.get("max_concurrency", 1))
+            await self._identify_limiter.wait(data.get("shard_id"))
+
+        if message.get("nonce") is not None:
+            writer.write(_encode({"op": "reply", "to": message["from"], "nonce": message["nonce"], "data": None}))
+
+    async def _restart(self, cluster_id: int, delay: float, last_start: Dict[int, float]) -> None:
+        try:
+            await asyncio.sleep(delay)
+            if not self._closing:
+                self._start_worker(cluster_id)
+                last_start[cluster_id] = time.monotonic()
+        finally:
+            del self._restarting[cluster_id]
+
+    async def _supervise(self) -> None:
+        last_start = {cluster_id: time.monotonic() for cluster_id in self.processes}
+
+        while not self._closing and (self.processes or self._restarting):
+            await asyncio.sleep(1)
+
+            for cluster_id, process in list(self.processes.items()):
+                if process.is_alive():
+                    continue
+                del self.processes[cluster_id]
+
+                if process.exitcode == FATAL_EXIT_CODE:
+                    print(f"cluster {cluster_id} was shut out by the gateway, not restarting it")
+                    continue
+
+                # a worker that stayed up for a while gets its backoff reset
+                if time.monotonic() - last_start[cluster_id] > 60:
+                    self.restarts[cluster_id] = 0
+                self.restarts[cluster_id] = self.restarts.get(cluster_id, 0) + 1
+
+                delay = min(2 ** (self.restarts[cluster_id] - 1), 60)
+                print(f"cluster {cluster_id} exited with {process.exitcode}, restarting in {delay}s")
+                # waited out on its own, the other workers are still watched meanwhile
+                self._restarting[cluster_id] = asyncio.ensure_future(self._restart(cluster_id, delay, last_start))
+
+    async def start(self) -> None:
+        if self.ipc_path is None:
+            # mkdtemp makes the directory 0700, so nobody else can reach the hub
+            self._ipc_dir = tempfile.mkdtemp(prefix="disno-cluster-")
+            self.ipc_path = os.path.join(self._ipc_dir, "hub.sock")
+        elif os.path.exists(self.ipc_path):
+            os.unlink(self.ipc_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.ipc_path)
+
+        for cluster_id in range(len(self.clusters)):
+            self._start_worker(cluster_id)
+
+        try:
+            await self._supervise()
+        finally:
+            self._closing = True
+            for task in list(self._restarting.values()):
+                task.cancel()
+            server.close()
+            for process in self.processes.values():
+                process.terminate()
+
+            if self._ipc_dir is not None:
+                shutil.rmtree(self._ipc_dir, ignore_errors=True)
+                self._ipc_dir = None
+                self.ipc_path = None
+
+    def run(self) -> None:
+        try:
+            asyncio.run(self.start())
+        except KeyboardInterrupt:
+            pass
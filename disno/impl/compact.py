@@ -0,0 +1,440 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Column-per-field tables for caching millions of members without a dict
+# (and a few hundred bytes) per member.
+
+import re
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional
+
+__all__ = (
+    'UserTable',
+    'MemberTable',
+    'UserView',
+    'MemberView',
+)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+# stands in for a missing timestamp in the int columns
+NO_TIME = -2 ** 63
+
+_AVATAR = re.compile(r'(a_)?([0-9a-f]{32})')
+# avatar column: a flag byte (0 none, 1 static, 2 animated) and the 16 byte hash
+AVATAR_SIZE = 17
+NO_AVATAR = bytes(AVATAR_SIZE)
+
+USER_FIELDS = frozenset({'id', 'username', 'discriminator', 'global_name', 'avatar', 'bot', 'system', 'public_flags'})
+MEMBER_FIELDS = frozenset({'user', 'guild_id', 'nick', 'roles', 'joined_at', 'premium_since', 'deaf', 'mute', 'pending', 'flags'})
+
+BOT, SYSTEM = 1, 2
+DEAF, MUTE, PENDING = 1, 2, 4
+
+
+def _pack_avatar(avatar) -> Optional[bytes]:
+    if avatar is None:
+        return NO_AVATAR
+    match = _AVATAR.fullmatch(avatar) if isinstance(avatar, str) else None
+    if match is None:
+        return None
+    return (b'\x02' if match.group(1) else b'\x01') + bytes.fromhex(match.group(2))
+
+
+def _unpack_avatar(packed) -> Optional[str]:
+    if not packed[0]:
+        return None
+    return ('a_' if packed[0] == 2 else '') + packed[1:].hex()
+
+
+def _pack_time(value) -> Optional[int]:
+    if value is None:
+        return NO_TIME
+    try:
+        return (datetime.fromisoformat(value) - EPOCH) // MICROSECOND
+    except (TypeError, ValueError):
+        return None
+
+
+def _unpack_time(value: int) -> Optional[str]:
+    if value == NO_TIME:
+        return None
+    return (EPOCH + value * MICROSECOND).isoformat(timespec='microseconds')
+
+
+class _Table:
+    # rows are kept packed: removing one moves the last row into its place
+
+    columns = ()
+    # fields every payload has but that are nearly always null; a null
+    # isn't kept anywhere and comes back as None from get()
+    nullable = ()
+
+    def __init__(self):
+        self.ids = array('Q')
+        self.index: Dict[int, int] = {}
+        # whatever the columns don't cover, by id; rarely anything
+        self.extras: Dict[int, dict] = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.index
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids)
+
+    def _add_row(self, entity_id: int) -> int:
+        row = len(self.ids)
+        self.ids.append(entity_id)
+        self.index[entity_id] = row
+        for name, empty in self.columns:
+            getattr(self, name).append(empty)
+        return row
+
+    def remove(self, entity_id: int) -> bool:
+        row = self.index.pop(entity_id, None)
+        if row is None:
+            return False
+        self.extras.pop(entity_id, None)
+
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.index[moved] = row
+            for name, _ in self.columns:
+                column = getattr(self, name)
+                column[row] = column[last]
+
+        self.ids.pop()
+        for name, _ in self.columns:
+            getattr(self, name).pop()
+        return True
+
+    def _set_extra(self, entity_id: int, key: str, value) -> None:
+        extras = self.extras.get(entity_id)
+        if extras is None:
+            extras = self.extras[entity_id] = {}
+        extras[key] = value
+
+    def _drop_extra(self, entity_id: int, key: str) -> None:
+        extras = self.extras.get(entity_id)
+        if extras is not None and key in extras:
+            del extras[key]
+            if not extras:
+                del self.extras[entity_id]
+
+
+class UserTable(_Table):
+    """Users, one row each, with the discriminator as an int and the
+    avatar hash packed into 17 bytes. Stands in for the dict
+    :class:`UserStore`.
+
+    Names aren't interned: they're nearly all unique, and an entry in the
+    intern table costs more than it would save.
+    """
+
+    columns = (
+        ('refs', 0),
+        ('usernames', None),
+        ('global_names', None),
+        ('discriminators', 0),
+        ('flags', 0),
+        ('public_flags', 0),
+    )
+    nullable = ('banner', 'accent_color', 'avatar_decoration_data')
+
+    def __init__(self):
+        super().__init__()
+        self.refs = array('I')
+        self.usernames = []
+        self.global_names = []
+        self.discriminators = array('H')
+        self.flags = array('B')
+        self.public_flags = array('Q')
+        self.avatars = bytearray()
+
+    def _add_row(self, entity_id: int) -> int:
+        self.avatars += NO_AVATAR
+        return super()._add_row(entity_id)
+
+    def remove(self, entity_id: int) -> bool:
+        row = self.index.get(entity_id)
+        if row is None:
+            return False
+        start, last = row * AVATAR_SIZE, len(self.avatars) - AVATAR_SIZE
+        self.avatars[start:start + AVATAR_SIZE] = self.avatars[last:]
+        del self.avatars[last:]
+        return super().remove(entity_id)
+
+    def store(self, data: dict) -> int:
+        user_id = int(data['id'])
+        row = self.index.get(user_id)
+        if row is None:
+            row = self._add_row(user_id)
+
+        for key, value in data.items():
+            if key == 'id':
+                continue
+            if key == 'username':
+                self.usernames[row] = value
+            elif key == 'global_name':
+                # usually the same as the username, so share the one string
+                username = self.usernames[row]
+                self.global_names[row] = username if value == username else value
+            elif key == 'discriminator' and isinstance(value, str) and value.isdigit() and int(value) < 65536:
+                self.discriminators[row] = int(value)
+            elif key == 'bot' or key == 'system':
+                bit = BOT if key == 'bot' else SYSTEM
+                self.flags[row] = (self.flags[row] | bit) if value else (self.flags[row] & ~bit)
+            elif key == 'public_flags' and isinstance(value, int) and 0 <= value < 2 ** 64:
+                self.public_flags[row] = value
+            elif value is None and key in self.nullable:
+                pass
+            else:
+                packed = _pack_avatar(value) if key == 'avatar' else None
+                if packed is None:
+                    self._set_extra(user_id, key, value)
+                    continue
+                start = row * AVATAR_SIZE
+                self.avatars[start:start + AVATAR_SIZE] = packed
+            self._drop_extra(user_id, key)
+        return user_id
+
+    def acquire(self, user_id: int) -> None:
+        self.refs[self.index[user_id]] += 1
+
+    def release(self, user_id: int) -> bool:
+        """Drops a reference, returning whether that was the last."""
+        row = self.index.get(user_id)
+        if row is None:
+            return False
+        if self.refs[row]:
+            self.refs[row] -= 1
+        return not self.refs[row]
+
+    def get(self, user_id: int) -> Optional[dict]:
+        row = self.index.get(user_id)
+        if row is None:
+            return None
+
+        discriminator = self.discriminators[row]
+        flags = self.flags[row]
+        user = {
+            'id': str(user_id),
+            'username': self.usernames[row],
+            'global_name': self.global_names[row],
+            'discriminator': f'{discriminator:04d}' if discriminator else '0',
+            'avatar': _unpack_avatar(self.avatars[row * AVATAR_SIZE:(row + 1) * AVATAR_SIZE]),
+            'public_flags': self.public_flags[row],
+        }
+        if flags & BOT:
+            user['bot'] = True
+        if flags & SYSTEM:
+            user['system'] = True
+        for key in self.nullable:
+            user[key] = None
+        if user_id in self.extras:
+            user.update(self.extras[user_id])
+        return user
+
+    def view(self, user_id: int) -> Optional['UserView']:
+        return UserView(self, user_id) if user_id in self.index else None
+
+
+class MemberTable(_Table):
+    """One guild's members, one row each. Role lists are packed into
+    bytes and shared by every member with the same roles, timestamps are
+    stored as ints. Stands in for the dict :class:`MemberStore`."""
+
+    columns = (
+        ('nicks', None),
+        ('roles', b''),
+        ('joined', NO_TIME),
+        ('premium', NO_TIME),
+        ('flags', 0),
+        ('member_flags', 0),
+    )
+    nullable = ('avatar', 'banner', 'communication_disabled_until')
+
+    def __init__(self):
+        super().__init__()
+        self.nicks = []
+        self.roles = []
+        self.joined = array('q')
+        self.premium = array('q')
+        self.flags = array('B')
+        self.member_flags = array('Q')
+        # most members share one of a handful of role lists
+        self._role_sets: Dict[bytes, bytes] = {b'': b''}
+
+    def store(self, user_id: int, data: dict) -> bool:
+        """Adds or updates a member, returning whether it's new."""
+        row = self.index.get(user_id)
+        new = row is None
+        if new:
+            row = self._add_row(user_id)
+
+        for key, value in data.items():
+            if key == 'user' or key == 'guild_id':
+                continue
+            if key == 'nick':
+                self.nicks[row] = value
+            elif key == 'roles':
+                packed = array('Q', map(int, value)).tobytes()
+                self.roles[row] = self._role_sets.setdefault(packed, packed)
+            elif key in ('deaf', 'mute', 'pending'):
+                bit = DEAF if key == 'deaf' else MUTE if key == 'mute' else PENDING
+                self.flags[row] = (self.flags[row] | bit) if value else (self.flags[row] & ~bit)
+            elif key == 'flags' and isinstance(value, int) and 0 <= value < 2 ** 64:
+                self.member_flags[row] = value
+            elif value is None and key in self.nullable:
+                pass
+            else:
+                packed = _pack_time(value) if key in ('joined_at', 'premium_since') else None
+                if packed is None:
+                    self._set_extra(user_id, key, value)
+                    continue
+                column = self.joined if key == 'joined_at' else self.premium
+                column[row] = packed
+            self._drop_extra(user_id, key)
+        return new
+
+    def role_ids(self, user_id: int) -> array:
+        roles = array('Q')
+        roles.frombytes(self.roles[self.index[user_id]])
+        return roles
+
+    def get(self, user_id: int) -> Optional[dict]:
+        row = self.index.get(user_id)
+        if row is None:
+            return None
+
+        flags = self.flags[row]
+        member = {
+            'nick': self.nicks[row],
+            'roles': [str(role_id) for role_id in self.role_ids(user_id)],
+            'joined_at': _unpack_time(self.joined[row]),
+            'premium_since': _unpack_time(self.premium[row]),
+            'deaf': bool(flags & DEAF),
+            'mute': bool(flags & MUTE),
+            'pending': bool(flags & PENDING),
+            'flags': self.member_flags[row],
+        }
+        for key in self.nullable:
+            member[key] = None
+        if user_id in self.extras:
+            member.update(self.extras[user_id])
+        return member
+
+    def view(self, user_id: int) -> Optional['MemberView']:
+        return MemberView(self, user_id) if user_id in self.index else None
+
+
+class UserView:
+    """A user in a :class:`UserTable`, read on access. Goes stale (raising
+    ``KeyError``) once the user's removed."""
+
+    __slots__ = ('_table', 'id')
+
+    def __init__(self, table: UserTable, user_id: int):
+        self._table = table
+        self.id: int = user_id
+
+    def __repr__(self):
+        return f"<UserView id={self.id} username={self.username!r}>"
+
+    @property
+    def _row(self) -> int:
+        return self._table.index[self.id]
+
+    @property
+    def username(self) -> str:
+        return self._table.usernames[self._row]
+
+    @property
+    def global_name(self) -> Optional[str]:
+        return self._table.global_names[self._row]
+
+    @property
+    def discriminator(self) -> str:
+        discriminator = self._table.discriminators[self._row]
+        return f'{discriminator:04d}' if discriminator else '0'
+
+    @property
+    def avatar(self) -> Optional[str]:
+        row = self._row
+        return _unpack_avatar(self._table.avatars[row * AVATAR_SIZE:(row + 1) * AVATAR_SIZE])
+
+    @property
+    def bot(self) -> bool:
+        return bool(self._table.flags[self._row] & BOT)
+
+    def to_dict(self) -> dict:
+        return self._table.get(self.id)
+
+
+class MemberView:
+    """A member in a :class:`MemberTable`, read on access."""
+
+    __slots__ = ('_table', 'id')
+
+    def __init__(self, table: MemberTable, user_id: int):
+        self._table = table
+        self.id: int = user_id
+
+    def __repr__(self):
+        return f"<MemberView id={self.id} nick={self.nick!r}>"
+
+    @property
+    def _row(self) -> int:
+        return self._table.index[self.id]
+
+    @property
+    def nick(self) -> Optional[str]:
+        return self._table.nicks[self._row]
+
+    @property
+    def roles(self) -> array:
+        return self._table.role_ids(self.id)
+
+    @property
+    def joined_at(self) -> Optional[datetime]:
+        value = self._table.joined[self._row]
+        return None if value == NO_TIME else EPOCH + value * MICROSECOND
+
+    @property
+    def premium_since(self) -> Optional[datetime]:
+        value = self._table.premium[self._row]
+        return None if value == NO_TIME else EPOCH + value * MICROSECOND
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._table.flags[self._row] & PENDING)
+
+    def to_dict(self) -> dict:
+        return self._table.get(self.id)
@@ -0,0 +1,190 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import traceback
+from collections import deque
+from typing import Any, Callable, Dict, List
+
+__all__ = (
+    'EventDispatcher',
+    'event_key',
+)
+
+# events whose payload is the guild itself
+GUILD_EVENTS = ('GUILD_CREATE', 'GUILD_UPDATE', 'GUILD_DELETE')
+
+
+def event_key(event: str, data) -> Any:
+    """What an event has to stay in order with: its guild, else its
+    channel, else its user. ``None`` for events that can run whenever."""
+    if not isinstance(data, dict):
+        return None
+
+    if event in GUILD_EVENTS:
+        return data.get('id')
+
+    for field in ('guild_id', 'channel_id'):
+        if data.get(field) is not None:
+            return data[field]
+
+    user = data.get('user')
+    if isinstance(user, dict):
+        return user.get('id')
+    return data.get('user_id')
+
+
+class EventDispatcher:
+    """Runs listeners as tasks, so a slow one doesn't hold up reading
+    from the gateway.
+
+    Events with the same :func:`event_key` run one after another in the
+    order they came in, events with different keys run side by side, at
+    most ``max_concurrency`` at a time.
+
+    Once ``high_water`` events are waiting or running, new ones are kept
+    in an ordered backlog and only started as earlier ones finish.
+    :meth:`dispatch` never waits, so the shard keeps reading and its
+    heartbeat ACKs and other control frames are still handled while
+    listeners are behind.
+
+    The backlog holds at most ``max_backlog`` events. Past that the
+    oldest one waiting is dropped to make room, and counted in
+    :attr:`dropped` (and by event name in :attr:`dropped_events`), so
+    listeners that can't keep up lose their stalest events rather than
+    the process running out of memory.
+
+    Exceptions raised by listeners are printed and otherwise ignored.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 64,
+        high_water: int = 1000,
+        max_backlog: int = 10000,
+        key: Callable[[str, Any], Any] = event_key,
+    ):
+        self.max_concurrency: int = max_concurrency
+        self.high_water: int = high_water
+        self.max_backlog: int = max_backlog
+        self.key = key
+
+        self.pending: int = 0
+        self.dropped: int = 0
+        self.dropped_events: Dict[str, int] = {}
+        self._backlog: deque = deque()
+        self._queues: Dict[Any, deque] = {}
+        self._tasks = set()
+        self._semaphore = None
+        self._idle = None
+
+    @property
+    def backlog(self) -> int:
+        """How many events are waiting for the pending ones to go below
+        ``high_water``."""
+        return len(self._backlog)
+
+    @property
+    def throttled(self) -> bool:
+        return self.pending >= self.high_water or bool(self._backlog)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def dispatch(self, event: str, data, listeners: List[Callable]) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._idle = asyncio.Event()
+
+        self._idle.clear()
+        item = (event, data, tuple(listeners))
+
+        if self.throttled:
+            # behind whatever is already waiting, so the order holds
+            backlog = self._backlog
+            while backlog and len(backlog) >= self.max_backlog:
+                dropped = backlog.popleft()[0]
+                self.dropped += 1
+                self.dropped_events[dropped] = self.dropped_events.get(dropped, 0) + 1
+            backlog.append(item)
+            return
+        self._start(item)
+
+    def _start(self, item) -> None:
+        self.pending += 1
+        event, data, _ = item
+
+        key = self.key(event, data)
+        if key is None:
+            self._spawn(self._run(*item))
+            return
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque([item])
+            self._spawn(self._drain(key, queue))
+        else:
+            queue.append(item)
+
+    async def _drain(self, key, queue: deque) -> None:
+        try:
+            while queue:
+                await self._run(*queue.popleft())
+        finally:
+            self._queues.pop(key, None)
+
+    async def _run(self, event: str, data, listeners) -> None:
+        try:
+            async with self._semaphore:
+                for listener in listeners:
+                    try:
+                        await listener(data)
+                    except Exception:
+                        print(f"[ERROR]     listener {listener.__name__} failed on {event}")
+                        traceback.print_exc()
+        finally:
+            # cancel() may have zeroed it already
+            self.pending = max(self.pending - 1, 0)
+            while self._backlog and self.pending < self.high_water:
+                self._start(self._backlog.popleft())
+            if not self.pending:
+                self._idle.set()
+
+    async def join(self) -> None:
+        """Waits for every dispatched event to be handled."""
+        if self._idle is not None and self.pending:
+            await self._idle.wait()
+
+    def cancel(self) -> None:
+        """Drops everything that's queued or running."""
+        for task in list(self._tasks):
+            task.cancel()
+        self._backlog.clear()
+        self._queues.clear()
+        self.pending = 0
+        if self._idle is not None:
+            self._idle.set()
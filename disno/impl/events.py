@@ -26,50 +26,89 @@ import aiohttp
 import asyncio
 import sys
 
-from ..websockets import Websocket
 from ..http import HTTPClient
+from ..websockets import DEFAULT_INTENTS
+from .dispatch import EventDispatcher
+from .offload import Offloader
+from .shards import ShardManager
+from .state import EntityCache
 
 class GatewayClient:
-    def __init__(self, loop=None):
+    def __init__(self, loop=None, *, shard_count=None, shard_ids=None, dispatcher=None, state=None, intents=DEFAULT_INTENTS):
         self.loop = asyncio.get_event_loop() if loop is None else loop
         user_agent = 'DiscordBot (https://github.com/QwireTeam/disno {0}) Python/{1[0]}.{1[1]} aiohttp/{2}'
         self.user_agent = user_agent.format("0.0.1", sys.version_info, aiohttp.__version__)
 
-        self.http = HTTPClient(loop=self.loop)
-        self.ws = None
+        self.state = EntityCache() if state is None else state
+        # no point caching what the gateway won't send updates for
+        self.state.use_intents(intents)
+        self.http = HTTPClient(loop=self.loop, entity_cache=self.state)
+        self.shards = ShardManager(
+            self.http,
+            self.process_events,
+            shard_count=shard_count,
+            shard_ids=shard_ids,
+            intents=intents,
+            event_filter=self.has_listeners,
+        )
         self.listeners = {}
+        self.dispatcher = EventDispatcher() if dispatcher is None else dispatcher
+        self.offloader = Offloader(self.http)
+
+        # set when running as a worker of a ClusterLauncher
+        self.cluster_id = None
+        self.bus = None
 
     @property
     def session(self):
         return self.http.session
 
+    @property
+    def ws(self):
+        """The first shard's websocket."""
+        if not self.shards.shards:
+            return None
+        return self.shards.shards[min(self.shards.shards)]
+
     async def login(self):
         data = await self.http.get_current_user()
         print(data)
 
     async def connect(self):
-        ws_params = {
-            'initial': True,
-            'shard_id': None,
-        }
-        self.ws = await Websocket.initialize(processor=self.process_events, token=self.http.bot_token)
-        while True:
-            await self.ws.poll_receive()
-
-    def listener(self, event = None):
+        try:
+            await self.shards.start()
+        finally:
+            await self.offloader.close()
+
+    async def close(self):
+        await self.shards.close()
+        await self.offloader.close()
+
+    def listener(self, event = None, *, executor = None):
+        """Registers a listener for ``event`` (the function's name by default).
+
+        With ``executor`` (``"thread"``, ``"process"`` or an executor) the
+        listener is a plain function run off the event loop, see
+        :class:`Offloader`.
+        """
         def inner(func):
             name = event or func.__name__
+            handler = func if executor is None else self.offloader.wrap(func, executor)
             if name not in self.listeners:
-                self.listeners[name] = [func]
+                self.listeners[name] = [handler]
             else:
-                self.listeners[name].append(func)
+                self.listeners[name].append(handler)
             return func
         return inner
 
+    def has_listeners(self, event):
+        return event in self.state.events or event.lower() in self.listeners
+
     async def process_events(self, event, data):
-        if event.lower() in self.listeners:
-            for l in self.listeners[event.lower()]:
-                await l(data)
+        self.state.process(event, data)
+        listeners = self.listeners.get(event.lower())
+        if listeners:
+            await self.dispatcher.dispatch(event, data, listeners)
 
     async def start(self):
         await self.login()
@@ -0,0 +1,309 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from weakref import WeakValueDictionary
+
+from .policy import EntityPolicy, _WeakDict
+
+__all__ = (
+    'MessageRing',
+    'MessageCache',
+)
+
+# messages kept per channel unless the policy says otherwise
+DEFAULT_CHANNEL_SIZE = 100
+
+# rough sizes, in bytes of JSON, of a message without its content and of
+# each item in its lists; close enough for a memory cap and far cheaper
+# than encoding every message
+MESSAGE_OVERHEAD = 800
+ITEM_SIZES = (
+    ('attachments', 400),
+    ('embeds', 600),
+    ('mentions', 300),
+    ('components', 300),
+    ('sticker_items', 100),
+    ('reactions', 100),
+)
+
+
+def estimate_size(message: dict) -> int:
+    size = MESSAGE_OVERHEAD + len(message.get('content') or '')
+    for field, item_size in ITEM_SIZES:
+        items = message.get(field)
+        if items:
+            size += item_size * len(items)
+    return size
+
+
+class MessageRing:
+    """One channel's latest messages, in a fixed number of slots that are
+    reused oldest first. Deleted messages leave a hole until their slot
+    comes round again."""
+
+    __slots__ = ('slots', 'index', 'next')
+
+    def __init__(self, capacity: int):
+        # (message, size, stored at) or None
+        self.slots: list = [None] * capacity
+        # message id -> slot
+        self.index: Dict[int, int] = {}
+        self.next: int = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def push(self, message_id: int, entry: tuple) -> Optional[tuple]:
+        """Stores an entry, returning the one it pushed out if any."""
+        position = self.next
+        old = self.slots[position]
+        if old is not None:
+            del self.index[int(old[0]['id'])]
+
+        self.slots[position] = entry
+        self.index[message_id] = position
+        self.next = (position + 1) % len(self.slots)
+        return old
+
+    def get(self, message_id: int) -> Optional[tuple]:
+        position = self.index.get(message_id)
+        return None if position is None else self.slots[position]
+
+    def replace(self, message_id: int, entry: tuple) -> None:
+        self.slots[self.index[message_id]] = entry
+
+    def remove(self, message_id: int) -> Optional[tuple]:
+        position = self.index.pop(message_id, None)
+        if position is None:
+            return None
+        entry = self.slots[position]
+        self.slots[position] = None
+        return entry
+
+    def pop_oldest(self) -> Optional[tuple]:
+        capacity = len(self.slots)
+        for offset in range(capacity):
+            position = (self.next + offset) % capacity
+            entry = self.slots[position]
+            if entry is not None:
+                self.slots[position] = None
+                del self.index[int(entry[0]['id'])]
+                return entry
+        return None
+
+
+class MessageCache:
+    """Recent messages, per channel, kept up to date from message events.
+
+    Each channel gets a :class:`MessageRing` of ``max_size`` messages (the
+    policy's, :data:`DEFAULT_CHANNEL_SIZE` without one), so looking a
+    message up by id is a couple of dict lookups and a busy channel only
+    ever pushes out its own old messages. Across channels, once the
+    messages take up more than ``max_memory`` bytes (going by
+    :func:`estimate_size`) the oldest ones in the channels least recently
+    written to go first.
+
+    The policy's ``ttl`` and ``weak`` work like they do for the other
+    kinds of entity. Expired messages are dropped as new ones come in,
+    not only when they're looked up, so they stop counting towards
+    ``max_memory``. Unlike messages pushed out for room, they aren't kept
+    weakly either.
+    """
+
+    def __init__(self, policy: EntityPolicy, *, max_memory: int = 32 * 1024 * 1024):
+        self.policy: EntityPolicy = policy
+        self.max_memory: int = max_memory
+        self.size: int = 0
+        self.evictions: int = 0
+        # least recently written first
+        self.channels: Dict[int, MessageRing] = OrderedDict()
+        self._weak = WeakValueDictionary() if policy.weak else None
+        # message id -> (channel id, when it was stored), oldest first
+        self._stored = OrderedDict() if policy.ttl is not None else None
+
+    def __len__(self):
+        return sum(map(len, self.channels.values()))
+
+    def __repr__(self):
+        return f"<MessageCache channels={len(self.channels)} messages={len(self)} size={self.size}>"
+
+    @property
+    def channel_size(self) -> int:
+        return DEFAULT_CHANNEL_SIZE if self.policy.max_size is None else self.policy.max_size
+
+    def _evicted(self, entry: tuple, expired: bool = False) -> None:
+        message_id = int(entry[0]['id'])
+        self.size -= entry[1]
+        self.evictions += 1
+        if self._stored is not None:
+            self._stored.pop(message_id, None)
+        # an expired message is gone for good, weak or not
+        if self._weak is not None and not expired:
+            self._weak[message_id] = entry[0]
+
+    def _stored_at(self, channel_id: int, message_id: int, now: float) -> None:
+        stored = self._stored
+        if stored is not None:
+            stored[message_id] = (channel_id, now)
+            stored.move_to_end(message_id)
+
+    def _expire(self, now: float) -> None:
+        stored = self._stored
+        if stored is None:
+            return
+
+        ttl = self.policy.ttl
+        while stored:
+            message_id, (channel_id, stored_at) = next(iter(stored.items()))
+            if now - stored_at <= ttl:
+                break
+            del stored[message_id]
+
+            ring = self.channels.get(channel_id)
+            if ring is None:
+                continue
+            entry = ring.remove(message_id)
+            if entry is not None:
+                self._evicted(entry, expired=True)
+            if not ring:
+                del self.channels[channel_id]
+
+    def _expired(self, entry: tuple) -> bool:
+        ttl = self.policy.ttl
+        return ttl is not None and time.monotonic() - entry[2] > ttl
+
+    def store(self, message: dict) -> None:
+        """Adds a new message (from ``MESSAGE_CREATE``)."""
+        if not self.policy.enabled or not self.channel_size:
+            return
+
+        channel_id = int(message['channel_id'])
+        ring = self.channels.get(channel_id)
+        if ring is not None and int(message['id']) in ring.index:
+            # sent again after a resume
+            self.update(message)
+            return
+
+        if ring is None:
+            ring = self.channels[channel_id] = MessageRing(self.channel_size)
+        else:
+            self.channels.move_to_end(channel_id)
+
+        if self._weak is not None:
+            message = _WeakDict(message)
+        size = estimate_size(message)
+        self.size += size
+
+        now = time.monotonic()
+        message_id = int(message['id'])
+        old = ring.push(message_id, (message, size, now))
+        if old is not None:
+            self._evicted(old)
+        self._stored_at(channel_id, message_id, now)
+        self._expire(now)
+
+        while self.size > self.max_memory and self.channels:
+            oldest_id, oldest = next(iter(self.channels.items()))
+            entry = oldest.pop_oldest()
+            if entry is None or not oldest:
+                del self.channels[oldest_id]
+            if entry is not None:
+                self._evicted(entry)
+
+    def update(self, data: dict) -> None:
+        """Applies a (partial) ``MESSAGE_UPDATE`` to a cached message.
+        Messages that aren't cached stay that way, there's not enough in
+        an update to go on."""
+        ring = self.channels.get(int(data['channel_id']))
+        if ring is None:
+            return
+        message_id = int(data['id'])
+        entry = ring.get(message_id)
+        if entry is None:
+            return
+
+        message = entry[0]
+        message.update(data)
+        size = estimate_size(message)
+        self.size += size - entry[1]
+
+        now = time.monotonic()
+        ring.replace(message_id, (message, size, now))
+        self._stored_at(int(data['channel_id']), message_id, now)
+        self._expire(now)
+
+    def remove(self, channel_id, message_id) -> Optional[dict]:
+        """Drops a message, returning it if it was cached."""
+        ring = self.channels.get(int(channel_id))
+        if ring is None:
+            return None
+        entry = ring.remove(int(message_id))
+        if entry is None:
+            return None
+        self.size -= entry[1]
+        if self._stored is not None:
+            self._stored.pop(int(message_id), None)
+        if self._weak is not None:
+            self._weak.pop(int(message_id), None)
+        return entry[0]
+
+    def remove_channel(self, channel_id) -> None:
+        ring = self.channels.pop(int(channel_id), None)
+        if ring is not None:
+            self.size -= sum(entry[1] for entry in ring.slots if entry is not None)
+            if self._stored is not None:
+                for message_id in ring.index:
+                    self._stored.pop(message_id, None)
+
+    def get(self, channel_id, message_id) -> Optional[dict]:
+        channel_id, message_id = int(channel_id), int(message_id)
+        ring = self.channels.get(channel_id)
+        entry = None if ring is None else ring.get(message_id)
+
+        if entry is not None:
+            if not self._expired(entry):
+                return entry[0]
+            ring.remove(message_id)
+            self._evicted(entry, expired=True)
+            if not ring:
+                del self.channels[channel_id]
+            return None
+
+        if self._weak is not None:
+            message = self._weak.get(message_id)
+            if message is not None and int(message['channel_id']) == channel_id:
+                return message
+        return None
+
+    def history(self, channel_id) -> List[dict]:
+        """A channel's cached messages, oldest first."""
+        ring = self.channels.get(int(channel_id))
+        if ring is None:
+            return []
+        capacity = len(ring.slots)
+        entries = (ring.slots[(ring.next + offset) % capacity] for offset in range(capacity))
+        return [entry[0] for entry in entries if entry is not None and not self._expired(entry)]
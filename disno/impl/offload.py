@@ -0,0 +1,226 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import pickle
+import shutil
+import socket
+import struct
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+__all__ = (
+    'Offloader',
+    'ThreadHTTP',
+    'RemoteHTTP',
+)
+
+_length = struct.Struct('>I')
+
+
+def _pack(obj) -> bytes:
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    return _length.pack(len(data)) + data
+
+
+def _check_method(http, name: str):
+    if name.startswith('_') or not callable(getattr(http, name, None)):
+        raise AttributeError(f"HTTPClient has no method {name!r}")
+    return getattr(http, name)
+
+
+class ThreadHTTP:
+    """What a listener running on a thread gets instead of the
+    :class:`HTTPClient`: the same methods, but blocking, with the requests
+    themselves made on the event loop."""
+
+    def __init__(self, http, loop: asyncio.AbstractEventLoop):
+        self._http = http
+        self._loop = loop
+
+    def __getattr__(self, name: str):
+        method = _check_method(self._http, name)
+
+        def call(*args, **kwargs):
+            return asyncio.run_coroutine_threadsafe(method(*args, **kwargs), self._loop).result()
+        return call
+
+
+class RemoteHTTP:
+    """What a listener running in another process gets instead of the
+    :class:`HTTPClient`. Calls are sent back to the main process and made
+    there, so every request still goes through its rate limiter."""
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self._socket = None
+
+    def _connect(self) -> None:
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(self.path)
+        self._reader = self._socket.makefile('rb')
+
+    def _call(self, name: str, args, kwargs):
+        if self._socket is None:
+            self._connect()
+
+        self._socket.sendall(_pack((name, args, kwargs)))
+        size, = _length.unpack(self._reader.read(_length.size))
+        ok, result = pickle.loads(self._reader.read(size))
+        if not ok:
+            raise result
+        return result
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, args, kwargs)
+
+
+# one per worker process, connected on first use
+_remote_http = None
+
+
+def _run_in_process(func, data, path: str):
+    global _remote_http
+    if _remote_http is None or _remote_http.path != path:
+        _remote_http = RemoteHTTP(path)
+    return func(data, _remote_http)
+
+
+class Offloader:
+    """Runs listeners off the event loop, for handlers that spend their
+    time on the CPU rather than waiting on IO.
+
+    ``executor`` is ``"thread"``, ``"process"`` or an executor of your
+    own. Offloaded listeners are plain functions taking the event data
+    and a stand-in for the HTTP client, since they can't await anything:
+
+    .. code-block:: python
+
+        @client.listener("message_create", executor="process")
+        def score(message, http):
+            if expensive_score(message["content"]) > 0.9:
+                http.send_message(message["channel_id"], content="nice")
+
+    Process listeners have to be module level functions so they can be
+    pickled, and so does the data they get. Their HTTP calls come back to
+    this process over a unix socket, kept in a directory only this user
+    can open since whatever connects to it gets to make those calls.
+    """
+
+    def __init__(self, http, *, max_workers: int = None):
+        self.http = http
+        self.max_workers: int = max_workers
+        self.thread_pool = None
+        self.process_pool = None
+        self.path: str = None
+        self._server = None
+        self._connections = set()
+
+    def _get_executor(self, executor) -> Executor:
+        if isinstance(executor, Executor):
+            return executor
+
+        if executor == "thread":
+            if self.thread_pool is None:
+                self.thread_pool = ThreadPoolExecutor(self.max_workers)
+            return self.thread_pool
+
+        if executor == "process":
+            if self.process_pool is None:
+                self.process_pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            return self.process_pool
+
+        raise ValueError(f"executor must be 'thread', 'process' or an Executor, not {executor!r}")
+
+    async def _start_server(self) -> None:
+        if self._server is not None:
+            return
+        # mkdtemp makes the directory 0700, so the socket is never
+        # reachable by anyone else, not even before it could be chmodded
+        self.path = os.path.join(tempfile.mkdtemp(prefix="disno-offload-"), "http.sock")
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add((task, writer))
+        try:
+            while True:
+                size, = _length.unpack(await reader.readexactly(_length.size))
+                name, args, kwargs = pickle.loads(await reader.readexactly(size))
+
+                try:
+                    reply = (True, await _check_method(self.http, name)(*args, **kwargs))
+                except Exception as exc:
+                    reply = (False, exc)
+
+                try:
+                    writer.write(_pack(reply))
+                except Exception as exc:
+                    # the result (or error) didn't pickle
+                    writer.write(_pack((False, RuntimeError(f"{name} failed: {exc!r}"))))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard((task, writer))
+            writer.close()
+
+    def wrap(self, func, executor):
+        """Turns ``func`` into a listener that runs on ``executor``."""
+        # fails early on a bad executor
+        self._get_executor(executor)
+
+        @functools.wraps(func)
+        async def listener(data):
+            loop = asyncio.get_running_loop()
+            # looked up each time, close() drops the pools
+            pool = self._get_executor(executor)
+            if isinstance(pool, ProcessPoolExecutor):
+                await self._start_server()
+                return await loop.run_in_executor(pool, _run_in_process, func, data, self.path)
+            return await loop.run_in_executor(pool, func, data, ThreadHTTP(self.http, loop))
+
+        return listener
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # worker processes stay connected, wait_closed() would wait on them
+            connections, self._connections = self._connections, set()
+            for _, writer in connections:
+                writer.close()
+            await asyncio.gather(*(task for task, _ in connections), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+            shutil.rmtree(os.path.dirname(self.path), ignore_errors=True)
+            self.path = None
+        for pool in (self.thread_pool, self.process_pool):
+            if pool is not None:
+                pool.shutdown(wait=False)
+        self.thread_pool = None
+        self.process_pool = None
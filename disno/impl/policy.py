@@ -0,0 +1,307 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Union
+from weakref import WeakValueDictionary
+
+from ..websockets import Intents
+
+__all__ = (
+    'EntityPolicy',
+    'CachePolicy',
+    'EntityMap',
+    'UsageTracker',
+)
+
+# the intents without which a kind of entity can't be kept up to date,
+# any one of them will do
+REQUIRED_INTENTS = {
+    'guilds': Intents.guilds,
+    'channels': Intents.guilds,
+    'roles': Intents.guilds,
+    'members': Intents.guild_members,
+    'presences': Intents.guild_presences,
+    'voice_states': Intents.guild_voice_states,
+    'messages': Intents.guild_messages | Intents.direct_messages,
+}
+
+# kinds whose lookups hand out the stored object itself, which weak mode
+# relies on to tell whether anything still uses an entry
+WEAK_KINDS = ('channels', 'roles', 'presences', 'voice_states', 'messages')
+
+
+class EntityPolicy:
+    """How one kind of entity is cached.
+
+    ``max_size`` caps how many are kept, evicting the least recently used
+    (stored or looked up) first. ``ttl`` evicts entries that haven't been
+    stored or looked up for that many seconds.
+
+    With ``weak``, evicted entries stay around for as long as something
+    else holds a reference to them and are dropped once nothing does, so
+    ``EntityPolicy(max_size=0, weak=True)`` keeps only what's in use.
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        weak: bool = False,
+    ):
+        self.enabled: bool = enabled
+        self.max_size: Optional[int] = max_size
+        self.ttl: Optional[float] = ttl
+        self.weak: bool = weak
+
+    def __repr__(self):
+        return f"<EntityPolicy enabled={self.enabled} max_size={self.max_size} ttl={self.ttl} weak={self.weak}>"
+
+    @property
+    def bounded(self) -> bool:
+        return self.max_size is not None or self.ttl is not None
+
+
+class CachePolicy:
+    """Which entities the :class:`EntityCache` keeps, and how.
+
+    Each kind is ``True`` (cache them all), ``False`` (don't cache them)
+    or an :class:`EntityPolicy`:
+
+    .. code-block:: python
+
+        policy = CachePolicy(
+            members=EntityPolicy(max_size=100_000),
+            messages=EntityPolicy(max_size=50, ttl=3600),
+            presences=False,
+        )
+
+    Users are kept for as long as one of their members is, so they follow
+    ``members``. Presences are off by default, there are a lot of them.
+
+    For messages ``max_size`` is per channel, and ``message_memory`` caps
+    how many bytes they take up altogether, see :class:`MessageCache`.
+    """
+
+    KINDS = ('guilds', 'channels', 'roles', 'members', 'presences', 'voice_states', 'messages')
+
+    def __init__(
+        self,
+        *,
+        guilds: Union[bool, EntityPolicy] = True,
+        channels: Union[bool, EntityPolicy] = True,
+        roles: Union[bool, EntityPolicy] = True,
+        members: Union[bool, EntityPolicy] = True,
+        presences: Union[bool, EntityPolicy] = False,
+        voice_states: Union[bool, EntityPolicy] = True,
+        messages: Union[bool, EntityPolicy] = True,
+        message_memory: int = 32 * 1024 * 1024,
+    ):
+        given = locals()
+        for kind in self.KINDS:
+            policy = given[kind]
+            if not isinstance(policy, EntityPolicy):
+                policy = EntityPolicy(enabled=bool(policy))
+            if policy.weak and kind not in WEAK_KINDS:
+                raise ValueError(f"{kind} can't be cached weakly, only {', '.join(WEAK_KINDS)} can")
+            setattr(self, kind, policy)
+        self.message_memory: int = message_memory
+
+    def __repr__(self):
+        enabled = [kind for kind in self.KINDS if getattr(self, kind).enabled]
+        return f"<CachePolicy {' '.join(enabled) or 'nothing'}>"
+
+    def get(self, kind: str) -> EntityPolicy:
+        return getattr(self, kind)
+
+    def missing_intents(self, intents: int) -> Dict[str, Intents]:
+        """The enabled kinds that ``intents`` won't keep up to date, with
+        the intents they'd need."""
+        return {
+            kind: required
+            for kind, required in REQUIRED_INTENTS.items()
+            if getattr(self, kind).enabled and not intents & required
+        }
+
+    def prune(self, intents: int) -> None:
+        """Turns off the kinds ``intents`` won't keep up to date, which
+        would otherwise go stale without anyone noticing."""
+        for kind, required in self.missing_intents(intents).items():
+            # a combination has no .name before 3.11, so spell out its members
+            names = " or ".join(intent.name for intent in Intents if intent & required)
+            print(f"[WARNING]   not caching {kind}, it needs the {names} intent")
+            getattr(self, kind).enabled = False
+
+
+class UsageTracker:
+    """Keeps track of when entries were last used, and evicts them with
+    ``evict(key)`` once there are more than the policy's ``max_size`` or
+    they've gone unused for its ``ttl``."""
+
+    def __init__(self, policy: EntityPolicy, evict: Callable):
+        self.policy: EntityPolicy = policy
+        self.evict = evict
+        self.evictions: int = 0
+        # key -> when it was last used, least recent first
+        self._used = OrderedDict()
+
+    def __len__(self):
+        return len(self._used)
+
+    def expired(self, key) -> bool:
+        ttl = self.policy.ttl
+        last_used = self._used.get(key)
+        return ttl is not None and last_used is not None and time.monotonic() - last_used > ttl
+
+    def use(self, key) -> None:
+        now = time.monotonic()
+        used = self._used
+        used[key] = now
+        used.move_to_end(key)
+
+        max_size = self.policy.max_size
+        if max_size is not None:
+            while len(used) > max_size:
+                self._evict(next(iter(used)))
+
+        ttl = self.policy.ttl
+        if ttl is not None:
+            while used:
+                oldest, last_used = next(iter(used.items()))
+                if now - last_used <= ttl:
+                    break
+                self._evict(oldest)
+
+    def _evict(self, key) -> None:
+        del self._used[key]
+        self.evictions += 1
+        self.evict(key)
+
+    def discard(self, key) -> None:
+        self._used.pop(key, None)
+
+    def clear(self) -> None:
+        self._used.clear()
+
+
+class _WeakDict(dict):
+    # plain dicts can't be weakly referenced
+    __slots__ = ('__weakref__',)
+
+
+class EntityMap:
+    """A dict of one kind of entity that sticks to its
+    :class:`EntityPolicy`.
+
+    ``on_evict(key, value)`` is called for entries evicted to make room
+    or for being stale, so indexes over them can be fixed up. Storing into
+    a disabled map does nothing.
+    """
+
+    def __init__(self, policy: EntityPolicy, on_evict: Callable = None):
+        self.policy: EntityPolicy = policy
+        self.on_evict = on_evict
+        self.data: Dict = {}
+        self.usage = UsageTracker(policy, self._evict) if policy.bounded else None
+        self._weak = WeakValueDictionary() if policy.weak else None
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data or (self._weak is not None and key in self._weak)
+
+    def __iter__(self):
+        return iter(self.data)
+
+    @property
+    def evictions(self) -> int:
+        return 0 if self.usage is None else self.usage.evictions
+
+    def values(self):
+        return self.data.values()
+
+    def _evict(self, key) -> None:
+        value = self.data.pop(key)
+        if self._weak is not None:
+            self._weak[key] = value
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def get(self, key):
+        value = self.data.get(key)
+        if value is None:
+            if self._weak is None:
+                return None
+            # still in use somewhere, so it's worth keeping again
+            value = self._weak.pop(key, None)
+            if value is None:
+                return None
+            self.data[key] = value
+        elif self.usage is not None and self.usage.expired(key):
+            self.usage.discard(key)
+            self.usage.evictions += 1
+            self._evict(key)
+            return None
+
+        if self.usage is not None:
+            self.usage.use(key)
+        return value
+
+    def store(self, key, value: dict) -> Optional[dict]:
+        """Stores ``value``, or updates what's stored with it. Returns
+        the stored dict."""
+        if not self.policy.enabled:
+            return None
+
+        cached = self.data.get(key)
+        if cached is None and self._weak is not None:
+            cached = self._weak.pop(key, None)
+
+        if cached is None:
+            cached = _WeakDict(value) if self._weak is not None else value
+        else:
+            cached.update(value)
+        self.data[key] = cached
+
+        if self.usage is not None:
+            self.usage.use(key)
+        return cached
+
+    def pop(self, key, default=None):
+        if self.usage is not None:
+            self.usage.discard(key)
+        if self._weak is not None:
+            self._weak.pop(key, None)
+        return self.data.pop(key, default)
+
+    def clear(self) -> None:
+        self.data.clear()
+        if self.usage is not None:
+            self.usage.clear()
+        if self._weak is not None:
+            self._weak.clear()
@@ -0,0 +1,228 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import random
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from ..websockets import DEFAULT_INTENTS, Websocket, IdentifyLimiter, ReconnectWebsocket
+
+__all__ = (
+    'ShardManager',
+)
+
+
+class ShardManager:
+    """Runs a bot's shards side by side on one event loop.
+
+    Unless given, the shard count comes from ``/gateway/bot``, and so does
+    the identify concurrency the shards are started with. Every shard
+    dispatches into the same ``processor``.
+
+    ``intents``, ``encoding`` (``'json'`` or ``'etf'``) and ``compress``
+    (``'zlib-stream'`` or ``'zstd-stream'``) are what every shard
+    connects with. Stick to JSON unless int snowflakes are wanted, ETF
+    decodes far slower (see :meth:`Websocket.initialize`). ``event_filter`` is handed to every shard so events
+    nothing listens for aren't decoded.
+
+    Shards with an entry in ``sessions`` (as returned by the
+    :attr:`sessions` property) resume that session instead of identifying.
+    """
+
+    def __init__(
+        self,
+        http,
+        processor,
+        *,
+        shard_count: Optional[int] = None,
+        shard_ids: Optional[List[int]] = None,
+        sessions: Optional[Dict[int, dict]] = None,
+        intents: int = DEFAULT_INTENTS,
+        encoding: str = 'json',
+        compress: str = 'zlib-stream',
+        event_filter = None,
+    ):
+        self.http = http
+        self.processor = processor
+        self.shard_count: Optional[int] = shard_count
+        self.shard_ids: Optional[List[int]] = shard_ids
+        self.resume_sessions: Dict[int, dict] = sessions or {}
+        self.intents: int = intents
+        self.encoding: str = encoding
+        self.compress: str = compress
+        self.event_filter = event_filter
+        self.shards: Dict[int, Websocket] = {}
+        self.identify_limiter: Optional[IdentifyLimiter] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def latencies(self) -> Dict[int, float]:
+        return {shard_id: ws.latency for shard_id, ws in self.shards.items()}
+
+    @property
+    def metrics(self) -> Dict[int, dict]:
+        return {shard_id: ws.metrics for shard_id, ws in self.shards.items()}
+
+    @property
+    def sessions(self) -> Dict[int, dict]:
+        return {
+            shard_id: {
+                "session_id": ws.session_id,
+                "sequence": ws.sequence,
+                "resume_gateway": ws.resume_gateway,
+            }
+            for shard_id, ws in self.shards.items()
+            if ws.session_id is not None
+        }
+
+    def shard_for_guild(self, guild_id: int) -> int:
+        return (int(guild_id) >> 22) % self.shard_count
+
+    async def request_members(self, guild_ids, **kwargs):
+        """Requests the members of every guild in ``guild_ids`` over the
+        gateway and yields the ``GUILD_MEMBERS_CHUNK`` payloads as they
+        come in, from whichever guild.
+
+        Each guild is asked for on the shard it's on, so requests on
+        different shards go out side by side and each shard's requests
+        are paced by its own send limit. Keyword arguments are passed on
+        to :meth:`Websocket.request_members`.
+
+        The chunks also go through the processor like any other event,
+        so loading members into the cache on startup is just:
+
+        .. code-block:: python
+
+            async for chunk in client.shards.request_members(guild_ids):
+                pass
+        """
+        targets = []
+        for guild_id in guild_ids:
+            ws = self.shards.get(self.shard_for_guild(guild_id))
+            if ws is None:
+                raise ValueError(f"guild {guild_id} isn't on a shard that's running here")
+            targets.append((ws, guild_id))
+
+        done = object()
+        queue = asyncio.Queue()
+
+        async def pump(ws, guild_id):
+            try:
+                async for chunk in ws.request_members(guild_id, **kwargs):
+                    queue.put_nowait(chunk)
+            except Exception as exc:
+                queue.put_nowait(exc)
+            finally:
+                queue.put_nowait(done)
+
+        tasks = [asyncio.ensure_future(pump(ws, guild_id)) for ws, guild_id in targets]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                item = await queue.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _run_shard(self, shard_id: int, gateway: str) -> None:
+        session = self.resume_sessions.pop(shard_id, {})
+
+        failures = 0
+        while True:
+            try:
+                ws = await Websocket.initialize(
+                    token=self.http.bot_token,
+                    processor=self.processor,
+                    session=self.http.session,
+                    shard_id=shard_id,
+                    shard_count=self.shard_count,
+                    identify_limiter=self.identify_limiter,
+                    intents=self.intents,
+                    encoding=self.encoding,
+                    compress=self.compress,
+                    event_filter=self.event_filter,
+                    gateway=gateway,
+                    session_id=session.get("session_id"),
+                    sequence=session.get("sequence"),
+                    resume_gateway=session.get("resume_gateway"),
+                )
+                break
+            except (ReconnectWebsocket, OSError, aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                if isinstance(exc, ReconnectWebsocket) and not exc.resume:
+                    # the session can't be resumed, identify instead
+                    session = {}
+                failures += 1
+                delay = min(2 ** (failures - 1), 60) * random.uniform(0.5, 1)
+                print(f"[ERROR]     shard {shard_id} couldn't connect ({exc!r}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        self.shards[shard_id] = ws
+        await ws.run()
+
+    async def start(self) -> None:
+        data = await self.http.get_bot_gateway()
+        limits = data["session_start_limit"]
+
+        if self.shard_count is None:
+            self.shard_count = data["shards"]
+        if self.shard_ids is None:
+            self.shard_ids = list(range(self.shard_count))
+
+        if limits["remaining"] < len(self.shard_ids) - len(self.resume_sessions):
+            raise RuntimeError(
+                f"only {limits['remaining']} session starts left, need {len(self.shard_ids)}; "
+                f"resets in {limits['reset_after'] / 1000:.0f}s"
+            )
+
+        max_concurrency = limits.get("max_concurrency", 1)
+        if self.identify_limiter is None:
+            self.identify_limiter = IdentifyLimiter(max_concurrency)
+        else:
+            self.identify_limiter.max_concurrency = max_concurrency
+        self._tasks = [
+            asyncio.ensure_future(self._run_shard(shard_id, data["url"]))
+            for shard_id in self.shard_ids
+        ]
+
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for ws in self.shards.values():
+            if ws.heartbeat is not None:
+                ws.heartbeat.stop()
+            if ws.socket is not None and not ws.socket.closed:
+                await ws.socket.close()
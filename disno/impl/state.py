@@ -0,0 +1,605 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from typing import Dict, Iterator, Optional, Set
+
+from ..http.utils import MISSING
+from .compact import MemberTable, UserTable
+from .messages import MessageCache
+from .policy import CachePolicy, EntityMap, UsageTracker
+
+__all__ = (
+    'EntityCache',
+    'UserStore',
+    'MemberStore',
+)
+
+# lists that come in GUILD_CREATE but are kept elsewhere (or not at all),
+# and aren't part of the guild REST returns
+GUILD_STRIP = ('channels', 'threads', 'members', 'presences', 'voice_states', 'roles')
+
+
+def _id(value) -> int:
+    # JSON gives snowflakes as str, ETF as int
+    return int(value)
+
+
+class UserStore:
+    """Users as plain dicts, with a count of the guilds each one is in."""
+
+    def __init__(self):
+        self.users: Dict[int, dict] = {}
+        self.refs: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.users)
+
+    def __contains__(self, user_id):
+        return user_id in self.users
+
+    def store(self, data: dict) -> int:
+        user_id = _id(data['id'])
+        cached = self.users.get(user_id)
+        if cached is None:
+            self.users[user_id] = data
+        else:
+            cached.update(data)
+        return user_id
+
+    def acquire(self, user_id: int) -> None:
+        self.refs[user_id] = self.refs.get(user_id, 0) + 1
+
+    def release(self, user_id: int) -> bool:
+        """Drops a reference, returning whether that was the last."""
+        refs = self.refs.pop(user_id, 0) - 1
+        if refs > 0:
+            self.refs[user_id] = refs
+            return False
+        return True
+
+    def remove(self, user_id: int) -> bool:
+        self.refs.pop(user_id, None)
+        return self.users.pop(user_id, None) is not None
+
+    def get(self, user_id: int) -> Optional[dict]:
+        return self.users.get(user_id)
+
+
+class MemberStore:
+    """One guild's members as plain dicts, without their user."""
+
+    def __init__(self):
+        self.members: Dict[int, dict] = {}
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, user_id):
+        return user_id in self.members
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.members)
+
+    def store(self, user_id: int, data: dict) -> bool:
+        """Adds or updates a member, returning whether it's new."""
+        member = {k: v for k, v in data.items() if k != 'user' and k != 'guild_id'}
+        cached = self.members.get(user_id)
+        if cached is None:
+            self.members[user_id] = member
+            return True
+        cached.update(member)
+        return False
+
+    def remove(self, user_id: int) -> bool:
+        return self.members.pop(user_id, None) is not None
+
+    def get(self, user_id: int) -> Optional[dict]:
+        return self.members.get(user_id)
+
+
+class EntityCache:
+    """Guilds, channels, roles, members, users, presences and voice
+    states as the gateway last described them, kept up to date from
+    dispatch events.
+
+    Everything is keyed by int id, with per guild indexes for channels,
+    roles and members. Each user is stored once, however many guilds
+    they share with the bot, and dropped once it's in none of them.
+
+    The :class:`HTTPClient` is given one through ``entity_cache`` by
+    :class:`GatewayClient`, and serves GETs of these routes from it
+    rather than the network:
+
+    - ``/guilds/{guild_id}`` (without ``with_counts``)
+    - ``/guilds/{guild_id}/channels``
+    - ``/guilds/{guild_id}/roles``
+    - ``/channels/{channel_id}``
+    - ``/channels/{channel_id}/messages/{message_id}``
+    - ``/guilds/{guild_id}/members/{user_id}``
+    - ``/users/{user_id}``
+
+    What's returned is shaped like the REST response, built from stored
+    data that's shared, so don't mutate it.
+
+    Deleted messages are handed to ``message_delete`` listeners as the
+    payload's ``cached_message`` (``cached_messages`` for bulk deletes),
+    ``None`` or empty if they weren't cached.
+
+    ``policy`` is a :class:`CachePolicy` picking what's kept and how
+    much of it. A guild whose channels or roles had some evicted stops
+    answering for the whole list until it's sent again.
+
+    With ``compact`` members and users go in a :class:`MemberTable` and
+    :class:`UserTable` instead of dicts, for bots with guilds too big to
+    cache otherwise. Those keep each field in its own array and build a
+    dict (or with :meth:`member_view`, a view) when asked for a member.
+    """
+
+    # dispatch events the cache handles, and the kinds of entity they're
+    # for; the ones for no kind in particular are always needed
+    EVENTS = {
+        'READY': (),
+        'USER_UPDATE': (),
+        'GUILD_CREATE': (),
+        'GUILD_DELETE': (),
+        'GUILD_UPDATE': ('guilds', 'roles'),
+        'GUILD_EMOJIS_UPDATE': ('guilds',),
+        'CHANNEL_CREATE': ('channels',),
+        'CHANNEL_UPDATE': ('channels',),
+        'CHANNEL_DELETE': ('channels',),
+        'THREAD_CREATE': ('channels',),
+        'THREAD_UPDATE': ('channels',),
+        'THREAD_DELETE': ('channels',),
+        'GUILD_ROLE_CREATE': ('roles',),
+        'GUILD_ROLE_UPDATE': ('roles',),
+        'GUILD_ROLE_DELETE': ('roles',),
+        'GUILD_MEMBER_ADD': ('members',),
+        'GUILD_MEMBER_UPDATE': ('members',),
+        'GUILD_MEMBER_REMOVE': ('members',),
+        'GUILD_MEMBERS_CHUNK': ('members',),
+        'PRESENCE_UPDATE': ('presences',),
+        'VOICE_STATE_UPDATE': ('voice_states',),
+        'MESSAGE_CREATE': ('messages',),
+        'MESSAGE_UPDATE': ('messages',),
+        'MESSAGE_DELETE': ('messages',),
+        'MESSAGE_DELETE_BULK': ('messages',),
+    }
+
+    def __init__(self, *, compact: bool = False, policy: CachePolicy = None):
+        self.user: Optional[dict] = None
+        self.compact: bool = compact
+        self.policy: CachePolicy = CachePolicy() if policy is None else policy
+        self._member_store = MemberTable if compact else MemberStore
+
+        policy = self.policy
+        self.guilds = EntityMap(policy.guilds, self._guild_evicted)
+        self.channels = EntityMap(policy.channels, self._channel_evicted)
+        # these are keyed by (guild id, role or user id)
+        self.roles = EntityMap(policy.roles, self._role_evicted)
+        self.presences = EntityMap(policy.presences, self._guild_entry_evicted)
+        self.voice_states = EntityMap(policy.voice_states, self._guild_entry_evicted)
+        self.messages = MessageCache(policy.messages, max_memory=policy.message_memory)
+
+        self.users = UserTable() if compact else UserStore()
+        # guild id -> that guild's MemberStore (or MemberTable)
+        self.members: Dict[int, MemberStore] = {}
+        self.member_usage = UsageTracker(policy.members, self._member_evicted) if policy.members.bounded else None
+
+        self.guild_channels: Dict[int, Set[int]] = {}
+        self.guild_threads: Dict[int, Set[int]] = {}
+        self.guild_roles: Dict[int, Set[int]] = {}
+        # user ids with a presence or voice state, per guild
+        self.guild_presences: Dict[int, Set[int]] = {}
+        self.guild_voice_states: Dict[int, Set[int]] = {}
+        # guilds whose channel or role lists lost some to eviction
+        self._partial_channels: Set[int] = set()
+        self._partial_roles: Set[int] = set()
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self._update_events()
+
+    def __repr__(self):
+        return (
+            f"<EntityCache guilds={len(self.guilds)} channels={len(self.channels)} "
+            f"members={sum(map(len, self.members.values()))} users={len(self.users)}>"
+        )
+
+    def _update_events(self) -> None:
+        self.events = frozenset(
+            event for event, kinds in self.EVENTS.items()
+            if not kinds or any(self.policy.get(kind).enabled for kind in kinds)
+        )
+        self._handlers = {event: getattr(self, '_' + event.lower()) for event in self.events}
+
+    def use_intents(self, intents: int) -> None:
+        """Stops caching what ``intents`` won't keep up to date, see
+        :meth:`CachePolicy.prune`."""
+        self.policy.prune(intents)
+        self._update_events()
+
+    def process(self, event: str, data) -> None:
+        """Updates the cache from a dispatch event, ignoring ones it
+        doesn't track."""
+        handler = self._handlers.get(event)
+        if handler is not None and isinstance(data, dict):
+            handler(data)
+
+    # lookups
+
+    def get_guild(self, guild_id) -> Optional[dict]:
+        guild = self.guilds.get(_id(guild_id))
+        if guild is None:
+            return None
+        roles = self.get_roles(guild_id)
+        if roles is None:
+            return None
+        return dict(guild, roles=roles)
+
+    def get_channel(self, channel_id) -> Optional[dict]:
+        return self.channels.get(_id(channel_id))
+
+    def _get_all(self, entities: EntityMap, ids) -> Optional[list]:
+        result = []
+        for entity_id in ids:
+            entity = entities.get(entity_id)
+            if entity is None:
+                return None
+            result.append(entity)
+        return result
+
+    def get_channels(self, guild_id) -> Optional[list]:
+        guild_id = _id(guild_id)
+        # only complete once the guild itself has come in
+        if guild_id not in self.guilds or guild_id in self._partial_channels:
+            return None
+        return self._get_all(self.channels, self.guild_channels.get(guild_id, ()))
+
+    def get_roles(self, guild_id) -> Optional[list]:
+        guild_id = _id(guild_id)
+        if guild_id not in self.guilds or guild_id in self._partial_roles:
+            return None
+        return self._get_all(self.roles, [(guild_id, role_id) for role_id in self.guild_roles.get(guild_id, ())])
+
+    def get_member(self, guild_id, user_id) -> Optional[dict]:
+        guild_id, user_id = _id(guild_id), _id(user_id)
+        members = self.members.get(guild_id)
+        if members is None:
+            return None
+        member = members.get(user_id)
+        if member is None:
+            return None
+
+        if self.member_usage is not None:
+            if self.member_usage.expired((guild_id, user_id)):
+                self._remove_member(guild_id, user_id)
+                return None
+            self.member_usage.use((guild_id, user_id))
+        return dict(member, user=self.users.get(user_id))
+
+    def get_user(self, user_id) -> Optional[dict]:
+        return self.users.get(_id(user_id))
+
+    def get_message(self, channel_id, message_id) -> Optional[dict]:
+        return self.messages.get(channel_id, message_id)
+
+    def get_presence(self, guild_id, user_id) -> Optional[dict]:
+        return self.presences.get((_id(guild_id), _id(user_id)))
+
+    def get_voice_state(self, guild_id, user_id) -> Optional[dict]:
+        return self.voice_states.get((_id(guild_id), _id(user_id)))
+
+    def member_view(self, guild_id, user_id):
+        """A :class:`MemberView` of a cached member, compact mode only."""
+        members = self.members.get(_id(guild_id))
+        return None if members is None else members.view(_id(user_id))
+
+    def user_view(self, user_id):
+        """A :class:`UserView` of a cached user, compact mode only."""
+        return self.users.view(_id(user_id))
+
+    def lookup(self, route, params: Optional[dict] = None):
+        """Answers a GET from the cache, returning ``MISSING`` when it
+        can't."""
+        if route.method != "GET":
+            return MISSING
+
+        path = route.raw_path
+        args = route.params
+        if path == '/channels/{channel_id}':
+            result = self.get_channel(args['channel_id'])
+        elif path == '/channels/{channel_id}/messages/{message_id}':
+            result = self.get_message(args['channel_id'], args['message_id'])
+        elif path == '/guilds/{guild_id}/members/{user_id}':
+            result = self.get_member(args['guild_id'], args['user_id'])
+        elif path == '/users/{user_id}':
+            result = self.get_user(args['user_id'])
+        elif path == '/guilds/{guild_id}':
+            # member and presence counts aren't tracked
+            if params and params.get('with_counts'):
+                return MISSING
+            result = self.get_guild(args['guild_id'])
+        elif path == '/guilds/{guild_id}/channels':
+            result = self.get_channels(args['guild_id'])
+        elif path == '/guilds/{guild_id}/roles':
+            result = self.get_roles(args['guild_id'])
+        else:
+            return MISSING
+
+        if result is None:
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return result
+
+    # eviction
+
+    def _guild_evicted(self, guild_id: int, guild: dict) -> None:
+        self._remove_guild(guild_id)
+
+    def _channel_evicted(self, channel_id: int, channel: dict) -> None:
+        if channel.get('guild_id') is not None:
+            guild_id = _id(channel['guild_id'])
+            self.guild_channels.get(guild_id, set()).discard(channel_id)
+            self.guild_threads.get(guild_id, set()).discard(channel_id)
+            self._partial_channels.add(guild_id)
+
+    def _role_evicted(self, key: tuple, role: dict) -> None:
+        guild_id, role_id = key
+        self.guild_roles.get(guild_id, set()).discard(role_id)
+        self._partial_roles.add(guild_id)
+
+    def _guild_entry_evicted(self, key: tuple, entry: dict) -> None:
+        guild_id, user_id = key
+        self.guild_presences.get(guild_id, set()).discard(user_id)
+        self.guild_voice_states.get(guild_id, set()).discard(user_id)
+
+    def _member_evicted(self, key: tuple) -> None:
+        members = self.members.get(key[0])
+        if members is not None and members.remove(key[1]):
+            self._release_user(key[1])
+
+    # storing
+
+    def _release_user(self, user_id: int) -> None:
+        if self.users.release(user_id):
+            # the bot's own user stays
+            if self.user is None or user_id != _id(self.user['id']):
+                self.users.remove(user_id)
+
+    def _store_member(self, guild_id: int, data: dict) -> None:
+        if not self.policy.members.enabled:
+            return
+
+        user_id = self.users.store(data['user'])
+        members = self.members.get(guild_id)
+        if members is None:
+            members = self.members[guild_id] = self._member_store()
+        if members.store(user_id, data):
+            self.users.acquire(user_id)
+        if self.member_usage is not None:
+            self.member_usage.use((guild_id, user_id))
+
+    def _remove_member(self, guild_id: int, user_id: int) -> None:
+        if self.member_usage is not None:
+            self.member_usage.discard((guild_id, user_id))
+        members = self.members.get(guild_id)
+        if members is not None and members.remove(user_id):
+            self._release_user(user_id)
+
+    def _store_channel(self, data: dict, guild_id: int = None) -> None:
+        if guild_id is not None and 'guild_id' not in data:
+            # the copies inside GUILD_CREATE leave it out
+            data['guild_id'] = str(guild_id)
+        else:
+            guild_id = data.get('guild_id')
+
+        channel_id = _id(data['id'])
+        if self.channels.store(channel_id, data) is not None and guild_id is not None:
+            index = self.guild_threads if 'thread_metadata' in data else self.guild_channels
+            index.setdefault(_id(guild_id), set()).add(channel_id)
+
+    def _remove_channel(self, data: dict) -> None:
+        channel_id = _id(data['id'])
+        self.channels.pop(channel_id, None)
+        self.messages.remove_channel(channel_id)
+        if data.get('guild_id') is not None:
+            guild_id = _id(data['guild_id'])
+            self.guild_channels.get(guild_id, set()).discard(channel_id)
+            self.guild_threads.get(guild_id, set()).discard(channel_id)
+
+    def _store_role(self, guild_id: int, role: dict) -> None:
+        self._store_guild_entry(self.roles, self.guild_roles, guild_id, _id(role['id']), role)
+
+    def _store_guild_entry(self, entries: EntityMap, index: dict, guild_id: int, entity_id: int, data: dict) -> None:
+        if entries.store((guild_id, entity_id), data) is not None:
+            index.setdefault(guild_id, set()).add(entity_id)
+
+    def _remove_guild_entry(self, entries: EntityMap, index: dict, guild_id: int, entity_id: int) -> None:
+        entries.pop((guild_id, entity_id), None)
+        index.get(guild_id, set()).discard(entity_id)
+
+    def _remove_guild(self, guild_id: int, *, messages: bool = False) -> None:
+        self.guilds.pop(guild_id, None)
+        self._partial_channels.discard(guild_id)
+        self._partial_roles.discard(guild_id)
+
+        for index in (self.guild_channels, self.guild_threads):
+            for channel_id in index.pop(guild_id, ()):
+                self.channels.pop(channel_id, None)
+                # messages are only gone when the guild is
+                if messages:
+                    self.messages.remove_channel(channel_id)
+
+        for index, entries in (
+            (self.guild_roles, self.roles),
+            (self.guild_presences, self.presences),
+            (self.guild_voice_states, self.voice_states),
+        ):
+            for user_id in index.pop(guild_id, ()):
+                entries.pop((guild_id, user_id), None)
+
+        members = self.members.pop(guild_id, None)
+        for user_id in members or ():
+            if self.member_usage is not None:
+                self.member_usage.discard((guild_id, user_id))
+            self._release_user(user_id)
+
+    # event handlers
+
+    def _ready(self, data: dict) -> None:
+        self.user = data['user']
+        self.users.store(self.user)
+
+    def _user_update(self, data: dict) -> None:
+        self.user = data
+        self.users.store(data)
+
+    def _guild_create(self, data: dict) -> None:
+        if data.get('unavailable'):
+            return
+
+        guild_id = _id(data['id'])
+        # a guild coming back from an outage is sent whole again
+        self._remove_guild(guild_id)
+
+        self.guilds.store(guild_id, {k: v for k, v in data.items() if k not in GUILD_STRIP})
+        self.guild_channels[guild_id] = set()
+        self.guild_roles[guild_id] = set()
+
+        for role in data.get('roles', ()):
+            self._store_role(guild_id, role)
+        for channel in data.get('channels', ()):
+            self._store_channel(channel, guild_id)
+        for thread in data.get('threads', ()):
+            self._store_channel(thread, guild_id)
+        for member in data.get('members', ()):
+            self._store_member(guild_id, member)
+        for presence in data.get('presences', ()):
+            self._presence_update(presence, guild_id)
+        for voice_state in data.get('voice_states', ()):
+            self._voice_state_update(voice_state, guild_id)
+
+    def _guild_update(self, data: dict) -> None:
+        guild_id = _id(data['id'])
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            return
+
+        guild.update({k: v for k, v in data.items() if k not in GUILD_STRIP})
+        if 'roles' in data:
+            for role_id in self.guild_roles.pop(guild_id, ()):
+                self.roles.pop((guild_id, role_id), None)
+            self.guild_roles[guild_id] = set()
+            self._partial_roles.discard(guild_id)
+            for role in data['roles']:
+                self._store_role(guild_id, role)
+
+    def _guild_delete(self, data: dict) -> None:
+        # an outage (``unavailable``) drops it too, it'll be sent whole again
+        self._remove_guild(_id(data['id']), messages=not data.get('unavailable'))
+
+    def _guild_emojis_update(self, data: dict) -> None:
+        guild = self.guilds.get(_id(data['guild_id']))
+        if guild is not None:
+            guild['emojis'] = data['emojis']
+
+    def _channel_create(self, data: dict) -> None:
+        self._store_channel(data)
+
+    _channel_update = _channel_create
+    _thread_create = _channel_create
+    _thread_update = _channel_create
+
+    def _channel_delete(self, data: dict) -> None:
+        self._remove_channel(data)
+
+    _thread_delete = _channel_delete
+
+    def _guild_role_create(self, data: dict) -> None:
+        self._store_role(_id(data['guild_id']), data['role'])
+
+    _guild_role_update = _guild_role_create
+
+    def _guild_role_delete(self, data: dict) -> None:
+        self._remove_guild_entry(self.roles, self.guild_roles, _id(data['guild_id']), _id(data['role_id']))
+
+    def _guild_member_add(self, data: dict) -> None:
+        self._store_member(_id(data['guild_id']), data)
+
+    _guild_member_update = _guild_member_add
+
+    def _guild_member_remove(self, data: dict) -> None:
+        guild_id, user_id = _id(data['guild_id']), _id(data['user']['id'])
+        self._remove_member(guild_id, user_id)
+        self._remove_guild_entry(self.presences, self.guild_presences, guild_id, user_id)
+        self._remove_guild_entry(self.voice_states, self.guild_voice_states, guild_id, user_id)
+
+    def _guild_members_chunk(self, data: dict) -> None:
+        guild_id = _id(data['guild_id'])
+        for member in data.get('members', ()):
+            self._store_member(guild_id, member)
+        for presence in data.get('presences', ()):
+            self._presence_update(presence, guild_id)
+
+    def _presence_update(self, data: dict, guild_id: int = None) -> None:
+        if guild_id is None:
+            guild_id = data.get('guild_id')
+            if guild_id is None:
+                return
+            guild_id = _id(guild_id)
+        user_id = _id(data['user']['id'])
+
+        if data.get('status') == 'offline':
+            self._remove_guild_entry(self.presences, self.guild_presences, guild_id, user_id)
+        else:
+            self._store_guild_entry(self.presences, self.guild_presences, guild_id, user_id, data)
+
+    def _voice_state_update(self, data: dict, guild_id: int = None) -> None:
+        if guild_id is None:
+            guild_id = data.get('guild_id')
+            if guild_id is None:
+                return
+            guild_id = _id(guild_id)
+        user_id = _id(data['user_id'])
+
+        # no channel means they've left
+        if data.get('channel_id') is None:
+            self._remove_guild_entry(self.voice_states, self.guild_voice_states, guild_id, user_id)
+        else:
+            self._store_guild_entry(self.voice_states, self.guild_voice_states, guild_id, user_id, data)
+
+    def _message_create(self, data: dict) -> None:
+        self.messages.store(data)
+
+    def _message_update(self, data: dict) -> None:
+        self.messages.update(data)
+
+    def _message_delete(self, data: dict) -> None:
+        data['cached_message'] = self.messages.remove(data['channel_id'], data['id'])
+
+    def _message_delete_bulk(self, data: dict) -> None:
+        removed = (self.messages.remove(data['channel_id'], message_id) for message_id in data['ids'])
+        data['cached_messages'] = [message for message in removed if message is not None]
@@ -23,56 +23,282 @@ SOFTWARE.
 """
 
 import asyncio
-import threading
-import zlib
+import bisect
+import random
+import time
 import sys
 import aiohttp
+from collections import deque
+from enum import IntFlag
 
-from .utils import to_json, from_json
+from .compression import PayloadTooLarge, get_decoder
+from .etf import to_etf, from_etf
+from .utils import to_json, from_json, scan_header
 
 
 class ClientOPType:
     dispatch = 0
     heartbeat = 1
     identify = 2
+    resume = 6
     reconnect = 7
+    request_guild_members = 8
+    invalid_session = 9
     hello = 10
     heartbeat_ack = 11
 
 
-class Heartbeat(threading.Thread):
-    def __init__(self, **kwargs):
-        self.ws = kwargs.pop("ws")
-        self.interval = kwargs.pop("interval")
-        self.ev = threading.Event()
+class Intents(IntFlag):
+    guilds = 1 << 0
+    guild_members = 1 << 1
+    guild_moderation = 1 << 2
+    guild_emojis_and_stickers = 1 << 3
+    guild_integrations = 1 << 4
+    guild_webhooks = 1 << 5
+    guild_invites = 1 << 6
+    guild_voice_states = 1 << 7
+    guild_presences = 1 << 8
+    guild_messages = 1 << 9
+    guild_message_reactions = 1 << 10
+    guild_message_typing = 1 << 11
+    direct_messages = 1 << 12
+    direct_message_reactions = 1 << 13
+    direct_message_typing = 1 << 14
+    message_content = 1 << 15
+    guild_scheduled_events = 1 << 16
+
+
+# what's been identified with so far (13955)
+DEFAULT_INTENTS = (
+    Intents.guilds
+    | Intents.guild_members
+    | Intents.guild_voice_states
+    | Intents.guild_messages
+    | Intents.guild_message_reactions
+    | Intents.direct_messages
+    | Intents.direct_message_reactions
+)
+
+
+# how payloads are (de)serialized for each gateway encoding
+ENCODINGS = {
+    'json': (to_json, from_json),
+    'etf': (to_etf, from_etf),
+}
+
+
+# close codes that mean the session is gone, but identifying again is fine
+SESSION_CLOSE_CODES = (4007, 4009)
+# close codes no amount of reconnecting will fix
+FATAL_CLOSE_CODES = (4004, 4010, 4011, 4012, 4013, 4014)
+
+
+class GatewayClosed(Exception):
+    """Raised out of :meth:`BaseWebsocket.run` when the gateway closes the
+    connection for good, e.g. a bad token or disallowed intents."""
+
+    def __init__(self, code: int):
+        self.code = code
+        super().__init__(f"the gateway closed the connection with code {code}")
+
+
+class ReconnectWebsocket(Exception):
+    """Raised out of :meth:`BaseWebsocket.poll_receive` when the connection
+    has to be re-established, resuming the session if ``resume`` is set."""
+
+    def __init__(self, *, resume: bool = True):
+        self.resume = resume
+        super().__init__("the websocket needs to reconnect")
+
+
+class LatencyHistogram:
+    """Heartbeat round trip times over the last ``size`` heartbeats,
+    bucketed by ``edges`` (upper bounds in seconds)."""
+
+    def __init__(self, size: int = 100, edges = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float('inf'))):
+        self.edges = tuple(edges)
+        self.counts = [0] * len(self.edges)
+        self.samples = deque(maxlen=size)
+
+    def _bucket(self, latency: float) -> int:
+        return min(bisect.bisect_left(self.edges, latency), len(self.edges) - 1)
+
+    def add(self, latency: float) -> None:
+        if len(self.samples) == self.samples.maxlen:
+            self.counts[self._bucket(self.samples[0])] -= 1
+        self.samples.append(latency)
+        self.counts[self._bucket(latency)] += 1
+
+    def buckets(self):
+        return list(zip(self.edges, self.counts))
+
+    @property
+    def average(self) -> float:
+        if not self.samples:
+            return float('inf')
+        return sum(self.samples) / len(self.samples)
+
+    def percentile(self, percent: float) -> float:
+        if not self.samples:
+            return float('inf')
+        ordered = sorted(self.samples)
+        index = min(int(len(ordered) * percent / 100), len(ordered) - 1)
+        return ordered[index]
+
+
+class Heartbeat:
+    """Keeps a gateway connection alive from a task on the websocket's
+    own loop.
+
+    If the previous heartbeat still hasn't been acknowledged by the time
+    the next one is due, the connection is considered zombied: it's
+    closed and :meth:`BaseWebsocket.poll_receive` raises
+    :exc:`ReconnectWebsocket` so the session gets resumed.
+    """
+
+    def __init__(self, *, ws, interval: float):
+        self.ws = ws
+        self.interval: float = interval
+        self.histogram: LatencyHistogram = LatencyHistogram()
+        self.latency: float = float('inf')
+        self.acked: bool = True
+        self.last_send: float = 0.0
+        self.last_ack: float = 0.0
+        # how late the last heartbeat went out, a sign of a blocked loop
+        self.behind: float = 0.0
+        self._task = None
 
-        super().__init__(**kwargs)
-    
-    def run(self):
-        while not self.ev.wait(self.interval):
-            data = self.get_payload()
-
-            f = asyncio.run_coroutine_threadsafe(self.ws.send_json(data), loop=self.ws.loop)
-            total = 10
-            while True:
-                try:
-                    f.result(10)
-                    break
-                except:
-                    total += 10
-    
     def get_payload(self):
         return {
             "op": ClientOPType.heartbeat,
             "d": self.ws.sequence,
         }
 
-    def stop(self):
-        self.ev.set()
+    async def beat(self) -> None:
+        self.acked = False
+        self.last_send = time.perf_counter()
+        await asyncio.wait_for(self.ws.send_json(self.get_payload()), timeout=10)
+
+    def ack(self) -> None:
+        self.acked = True
+        self.last_ack = time.perf_counter()
+        self.latency = self.last_ack - self.last_send
+        self.histogram.add(self.latency)
+
+    async def run(self) -> None:
+        while True:
+            due = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.behind = time.perf_counter() - due
+
+            if not self.acked:
+                # no ack since the last heartbeat, the connection is dead
+                self.ws.zombied = True
+                await self.ws.socket.close(code=4000)
+                return
+
+            try:
+                await self.beat()
+            except asyncio.TimeoutError:
+                self.ws.zombied = True
+                await self.ws.socket.close(code=4000)
+                return
+
+    def start(self) -> None:
+        self._task = self.ws.loop.create_task(self.run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class IdentifyLimiter:
+    """Spaces out identifies according to the session start limit.
+
+    Shards share an identify bucket when their ``shard_id %
+    max_concurrency`` matches, and each bucket may identify once every
+    ``per`` seconds.
+    """
+
+    def __init__(self, max_concurrency: int = 1, per: float = 5.0):
+        self.max_concurrency: int = max_concurrency
+        self.per: float = per
+        self._next: dict = {}
+        self._locks: dict = {}
+
+    async def wait(self, shard_id: int = None) -> None:
+        key = (shard_id or 0) % self.max_concurrency
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+
+        async with lock:
+            delay = self._next.get(key, 0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next[key] = time.monotonic() + self.per
+
+
+class SendLimiter:
+    """Keeps a connection under the gateway's limit of ``limit`` sends
+    every ``per`` seconds.
+
+    ``reserved`` of those are kept for urgent sends (heartbeats,
+    identifies and resumes), which never wait, so nothing else can use up
+    the window and get the connection zombied.
+    """
+
+    def __init__(self, limit: int = 120, per: float = 60.0, reserved: int = 5):
+        self.limit: int = limit
+        self.per: float = per
+        self.reserved: int = reserved
+        # when each send in the current window went out
+        self._sent = deque()
+        self._lock = None
+
+    def reset(self) -> None:
+        """Every connection gets a window of its own."""
+        self._sent.clear()
+
+    def _expire(self, now: float) -> None:
+        while self._sent and now - self._sent[0] >= self.per:
+            self._sent.popleft()
+
+    async def wait(self, *, urgent: bool = False) -> None:
+        if urgent:
+            self._sent.append(time.monotonic())
+            return
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                if len(self._sent) < self.limit - self.reserved:
+                    break
+                await asyncio.sleep(self._sent[0] + self.per - now)
+            self._sent.append(now)
+
+
+# sends that can't be held up behind anything else
+URGENT_OPS = (ClientOPType.heartbeat, ClientOPType.identify, ClientOPType.resume)
 
 
 class BaseWebsocket:
-    def __init__(self, token: str, *, session: aiohttp.ClientSession = None, loop = None):
+    def __init__(
+        self,
+        token: str,
+        *,
+        session: aiohttp.ClientSession = None,
+        loop = None,
+        decoder = None,
+        encoding: str = 'json',
+        compress: str = 'zlib-stream',
+        event_filter = None,
+    ):
         user_agent = 'DiscordBot (https://github.com/QwireDev/disno {0}) Python/{1[0]}.{1[1]} aiohttp/{2}'
         self.user_agent = user_agent.format("1.0.0a.1", sys.version_info, aiohttp.__version__)
         self.token = token
@@ -91,28 +317,75 @@ class BaseWebsocket:
         self.session = session
 
         self.socket = None
-        self.heart = None
+        self.heartbeat = None
+        self.zombied = False
         self.sequence = None
         self.session_id = None
-
-        self.thread_id = threading.get_ident()
-
-        self._buffer = bytearray()
-        self._inflator = zlib.decompressobj()
+        self.resume_gateway = None
+        self.gateway = None
+        # appended to the gateway url, resume url included
+        self.query = ''
+
+        # how reconnecting has been going
+        self.reconnects = 0
+        self.resume_attempts = 0
+        self.resume_successes = 0
+        self.identifies = 0
+        # reconnects since the session was last up, for backing off
+        self._failures = 0
+
+        self.decoder = get_decoder(compress) if decoder is None else decoder
+
+        if encoding not in ENCODINGS:
+            raise ValueError(f"unknown gateway encoding {encoding!r}, expected one of {', '.join(ENCODINGS)}")
+        self.encoding = encoding
+        self.dumps, self.loads = ENCODINGS[encoding]
+
+        # event name -> whether it's worth decoding, None for everything
+        self.event_filter = event_filter
+        self.skipped_events = 0
+
+        self.send_limiter = SendLimiter()
+
+    @property
+    def latency(self) -> float:
+        """The round trip time of the last acknowledged heartbeat."""
+        if self.heartbeat is None:
+            return float('inf')
+        return self.heartbeat.latency
+
+    @property
+    def metrics(self) -> dict:
+        return {
+            "latency": self.latency,
+            "reconnects": self.reconnects,
+            "resume_attempts": self.resume_attempts,
+            "resume_successes": self.resume_successes,
+            "identifies": self.identifies,
+            "skipped_events": self.skipped_events,
+        }
 
     async def send(self, data):
         await self.socket.send_str(data)
 
     async def send_json(self, data):
+        """Sends a payload in the connection's encoding, waiting for room
+        under the send limit first unless it's urgent."""
+        await self.send_limiter.wait(urgent=data.get("op") in URGENT_OPS)
         print("[SENT]     ", data)
-        await self.socket.send_str(to_json(data))
+        if self.encoding == 'etf':
+            await self.socket.send_bytes(self.dumps(data))
+        else:
+            await self.socket.send_str(self.dumps(data))
 
     async def ack_hello(self, data):
+        if self.heartbeat is not None:
+            self.heartbeat.stop()
         self.heartbeat = Heartbeat(ws=self, interval=data["d"]["heartbeat_interval"] / 1000)
-        await self.send_json(self.heartbeat.get_payload())
+        await self.heartbeat.beat()
         self.heartbeat.start()
 
-    async def connect(self):
+    async def connect(self, url: str = None):
         kwargs = {
             'max_msg_size': 0,
             'timeout': 30.0,
@@ -122,62 +395,243 @@ class BaseWebsocket:
             }
         }
 
-        return await self.session.ws_connect(self.gateway, **kwargs)
+        # a new connection gets a new decompression context and send window
+        self.decoder.reset()
+        self.send_limiter.reset()
+        self.zombied = False
+
+        return await self.session.ws_connect(url or self.gateway, **kwargs)
+
+    def wants_event(self, event: str) -> bool:
+        if event in ('READY', 'RESUMED') or self.event_filter is None:
+            return True
+        return self.event_filter(event)
 
     async def process_receive(self, msg):
+        # dispatches nobody listens for are dropped without decoding them,
+        # all that's needed from those is the sequence
+        if self.event_filter is not None and self.encoding == 'json':
+            header = scan_header(msg)
+            if header is not None:
+                op, sequence, event = header
+                if op == ClientOPType.dispatch and not self.wants_event(event):
+                    if sequence is not None:
+                        self.sequence = sequence
+                    self.skipped_events += 1
+                    return None
+
         try:
-            data = from_json(msg)
+            data = self.loads(msg)
         except:
             print(type(msg))
             print(msg)
+            raise
         if data["s"] is not None:
             self.sequence = data["s"]
         op = data["op"]
         event = data["t"]
-        print("[RECEIVED] ", data)
         if op == ClientOPType.hello:
             await self.ack_hello(data)
         elif op == ClientOPType.heartbeat:
-            await self.send_json(self.heartbeat.get_payload())
+            await self.heartbeat.beat()
+        elif op == ClientOPType.heartbeat_ack:
+            self.heartbeat.ack()
+        elif op == ClientOPType.invalid_session:
+            # d says whether the session can still be resumed
+            if not data.get('d'):
+                self.session_id = None
+                self.resume_gateway = None
+            # the gateway asks for a random wait of 1 to 5 seconds
+            await asyncio.sleep(random.uniform(1, 5))
+            raise ReconnectWebsocket(resume=bool(data.get('d')))
         elif op == ClientOPType.dispatch and event == 'READY':
             payload = data.get('d')
             self.session_id = payload.get('session_id')
+            self.resume_gateway = payload.get('resume_gateway_url')
+            self._failures = 0
+        elif op == ClientOPType.dispatch and event == 'RESUMED':
+            self.resume_successes += 1
+            self._failures = 0
 
-        return op, event
+        return data
 
     async def poll_receive(self):
         msg = await self.socket.receive(timeout=120)
-        if type(msg.data) is bytes:
-            self._buffer.extend(msg.data)
+        if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+            if self.heartbeat is not None:
+                self.heartbeat.stop()
+
+            code = msg.data if msg.type == aiohttp.WSMsgType.CLOSE else self.socket.close_code
+            if code in FATAL_CLOSE_CODES:
+                raise GatewayClosed(code)
+            if code in SESSION_CLOSE_CODES:
+                self.session_id = None
+                self.resume_gateway = None
+            raise ReconnectWebsocket(resume=code not in SESSION_CLOSE_CODES)
 
-            # check if the last four bytes are equal to ZLIB_SUFFIX
-            if len(msg.data) < 4 or msg.data[-4:] != b'\x00\x00\xff\xff':
-                return
+        if type(msg.data) is bytes:
+            try:
+                msg = self.decoder.feed(msg.data)
+            except PayloadTooLarge as exc:
+                print(f"[ERROR]     {exc}")
+                # replaying the same events would hit the same cap
+                raise ReconnectWebsocket(resume=False) from exc
 
-            # if the message *does* end with ZLIB_SUFFIX,
-            # get the full message by decompressing the buffers
+            # the rest of the message is still to come
             # NOTE: the message is utf-8 encoded.
-            msg = self._inflator.decompress(self._buffer)
-            self._buffer = bytearray()
+            if msg is None:
+                return
+        else:
+            msg = msg.data
         await self.process_receive(msg)
 
+    async def run(self):
+        """Reads from the gateway until cancelled, reconnecting whenever
+        the connection drops.
+
+        Reconnects resume the session whenever the gateway allows it.
+        Repeated reconnects back off exponentially (up to a minute) until
+        the session is up again. Only :exc:`GatewayClosed` gets out.
+        """
+        while True:
+            try:
+                await self.poll_receive()
+                continue
+            except ReconnectWebsocket as exc:
+                resume = exc.resume
+            except (OSError, aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                print(f"[ERROR]     lost the gateway connection: {exc!r}")
+                resume = True
+
+            while True:
+                if self._failures:
+                    delay = min(2 ** (self._failures - 1), 60) * random.uniform(0.5, 1)
+                    await asyncio.sleep(delay)
+                self._failures += 1
+
+                try:
+                    await self.reconnect(resume=resume)
+                    break
+                except ReconnectWebsocket as exc:
+                    resume = exc.resume
+                except (OSError, aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                    print(f"[ERROR]     couldn't reconnect to the gateway: {exc!r}")
+
+    async def wait_to_identify(self):
+        """Called before connecting when the connection will identify,
+        rather than resume. Nothing is being read from the gateway yet, so
+        waiting here can't get the connection flagged as zombied."""
+        pass
+
     async def identify_payload(self):
         raise NotImplementedError()
 
     async def resume_payload(self):
         raise NotImplementedError()
 
+    async def reconnect(self, *, resume: bool = True):
+        """Opens a new connection, resuming the session if possible and
+        identifying again otherwise."""
+        if self.heartbeat is not None:
+            self.heartbeat.stop()
+        if self.socket is not None and not self.socket.closed:
+            await self.socket.close(code=4000)
+
+        self.reconnects += 1
+        resume = resume and self.session_id is not None
+        if not resume:
+            await self.wait_to_identify()
+
+        if resume and self.resume_gateway:
+            self.socket = await self.connect(self.resume_gateway + self.query)
+        else:
+            self.socket = await self.connect()
+        await self.poll_receive()
+
+        if resume:
+            self.resume_attempts += 1
+            await self.resume_payload()
+        else:
+            await self.identify_payload()
+
 
 class Websocket(BaseWebsocket):
-    def __init__(self, token: str, processor, *, session: aiohttp.ClientSession = None, loop = None):
-        super().__init__(token, session=session, loop=loop)
+    def __init__(
+        self,
+        token: str,
+        processor,
+        *,
+        session: aiohttp.ClientSession = None,
+        loop = None,
+        shard_id: int = None,
+        shard_count: int = None,
+        identify_limiter: IdentifyLimiter = None,
+        intents: int = DEFAULT_INTENTS,
+        decoder = None,
+        encoding: str = 'json',
+        compress: str = 'zlib-stream',
+        event_filter = None,
+    ):
+        super().__init__(
+            token,
+            session=session,
+            loop=loop,
+            decoder=decoder,
+            encoding=encoding,
+            compress=compress,
+            event_filter=event_filter,
+        )
         self.processor = processor
+        self.shard_id = shard_id
+        self.shard_count = shard_count
+        self.identify_limiter = identify_limiter
+        self.intents = intents
+        # nonce -> queue of GUILD_MEMBERS_CHUNK payloads for request_members
+        self._member_requests = {}
+        self._nonce = 0
 
     @classmethod
-    async def initialize(cls, *args, **kwargs):
+    async def initialize(
+        cls,
+        *args,
+        gateway: str = None,
+        session_id: str = None,
+        sequence: int = None,
+        resume_gateway: str = None,
+        **kwargs,
+    ):
+        """Connects to the gateway and identifies, or resumes the session
+        given by ``session_id`` and ``sequence`` (through
+        ``resume_gateway`` when given).
+
+        Pass ``encoding='etf'`` to have the gateway talk in Erlang's term
+        format instead of JSON, with snowflakes coming through as ints.
+        It's there for that, not for speed: the decoder is pure Python
+        and an order of magnitude slower than JSON, and events nothing
+        listens for can only be skipped undecoded with JSON (see
+        ``python -m benchmarks.gateway_decode``).
+
+        ``compress`` picks the transport compression, ``'zlib-stream'``
+        or ``'zstd-stream'``. zstd needs the zstandard module and falls
+        back to zlib without it."""
         ws = cls(*args, **kwargs)
 
-        ws.gateway = "wss://gateway.discord.gg?encoding='json'&v=9&compress=zlib-stream" # TODO: uhh
+        if gateway is None:
+            gateway = "wss://gateway.discord.gg"
+        ws.query = f"?encoding={ws.encoding}&v=9&compress={ws.decoder.compress}"
+        ws.gateway = gateway + ws.query
+
+        if session_id is not None:
+            ws.session_id = session_id
+            ws.sequence = sequence
+            ws.resume_gateway = resume_gateway
+            ws.socket = await ws.connect(resume_gateway + ws.query if resume_gateway else None)
+            await ws.poll_receive()
+            ws.resume_attempts += 1
+            await ws.resume_payload()
+            return ws
+
+        await ws.wait_to_identify()
         ws.socket = await ws.connect()
 
         await ws.poll_receive()
@@ -185,12 +639,16 @@ class Websocket(BaseWebsocket):
 
         return ws
 
+    async def wait_to_identify(self):
+        if self.identify_limiter is not None:
+            await self.identify_limiter.wait(self.shard_id)
+
     async def identify_payload(self):
         package = {
             "op": ClientOPType.identify,
             "d": {
                 "token": self.token,
-                "intents": 13955,  # ik
+                "intents": int(self.intents),
                 "properties": {
                     "$os": sys.platform,
                     "$browser": "disno",
@@ -205,11 +663,73 @@ class Websocket(BaseWebsocket):
             }
         }
 
+        if self.shard_id is not None and self.shard_count is not None:
+            package["d"]["shard"] = [self.shard_id, self.shard_count]
+
+        self.identifies += 1
         await self.send_json(package)
 
+    async def request_members(
+        self,
+        guild_id: int,
+        *,
+        query: str = None,
+        limit: int = 0,
+        user_ids = None,
+        presences: bool = False,
+        timeout: float = 30.0,
+    ):
+        """Requests a guild's members over the gateway (opcode 8) and
+        yields each ``GUILD_MEMBERS_CHUNK`` payload as it comes in, up to
+        1000 members at a time.
+
+        By default that's every member, which needs the guild members
+        intent. ``query`` limits it to usernames starting with it and
+        ``user_ids`` to those users (at most 100). Each chunk has to come
+        within ``timeout`` seconds of the last.
+
+        .. code-block:: python
+
+            async for chunk in ws.request_members(guild_id):
+                print(len(chunk["members"]))
+        """
+        if user_ids is None and not query and not self.intents & Intents.guild_members:
+            raise ValueError("requesting every member needs the guild_members intent")
+        if presences and not self.intents & Intents.guild_presences:
+            raise ValueError("requesting presences needs the guild_presences intent")
+
+        self._nonce += 1
+        nonce = str(self._nonce)
+        queue = asyncio.Queue()
+        self._member_requests[nonce] = queue
+
+        payload = {"guild_id": guild_id, "limit": limit, "presences": presences, "nonce": nonce}
+        if user_ids is not None:
+            payload["user_ids"] = user_ids
+        else:
+            payload["query"] = query or ""
+
+        try:
+            await self.send_json({"op": ClientOPType.request_guild_members, "d": payload})
+            received = 0
+            while True:
+                chunk = await asyncio.wait_for(queue.get(), timeout)
+                received += 1
+                yield chunk
+                if received >= chunk.get("chunk_count", 1):
+                    return
+        finally:
+            self._member_requests.pop(nonce, None)
+
+    def wants_event(self, event: str) -> bool:
+        # chunks have to be read while someone's waiting on them
+        if event == 'GUILD_MEMBERS_CHUNK' and self._member_requests:
+            return True
+        return super().wants_event(event)
+
     async def resume_payload(self):
         resume_payload = {
-            "op": 6,
+            "op": ClientOPType.resume,
             "d": {
                 "token": self.token,
                 "session_id": self.session_id,
@@ -220,34 +740,23 @@ class Websocket(BaseWebsocket):
         await self.send_json(resume_payload)
 
     async def process_receive(self, msg):
-        try:
-            data = from_json(msg)
-        except:
-            print(type(msg))
-            print(msg)
-
-        if data["s"] is not None:
-            self.sequence = data["s"]
+        data = await super().process_receive(msg)
+        if data is None:
+            return
 
         op = data["op"]
         event = data["t"]
-        print("[RECEIVED] ", data)
-        if op == ClientOPType.hello:
-            await self.ack_hello(data)
-        elif op == ClientOPType.heartbeat:
-            await self.send_json(self.heartbeat.get_payload())
-        elif op == ClientOPType.dispatch and event == 'READY':
-            payload = data.get('d')
-            self.session_id = payload.get('session_id')
 
         if op == ClientOPType.dispatch:
-            if self.processor:
+            if event == 'GUILD_MEMBERS_CHUNK':
+                chunk = data.get('d') or {}
+                queue = self._member_requests.get(chunk.get('nonce'))
+                if queue is not None:
+                    queue.put_nowait(chunk)
+
+            if self.processor and self.wants_event(event):
                 await self.processor(event, data.get('d'))
 
         if op == ClientOPType.reconnect:
-            # TODO: Test if this works, I haven't gotten a reconnect yet
-            self.heart.stop()
-            await self.socket.close()
-            self.socket = await self.connect()
-            await self.resume_payload()
-            self.heart = Heartbeat(ws=self, interval=self.heart.interval)
+            await self.socket.close(code=4000)
+            raise ReconnectWebsocket(resume=True)
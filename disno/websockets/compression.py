@@ -0,0 +1,180 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import zlib
+from typing import Optional
+
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+__all__ = (
+    'PayloadTooLarge',
+    'ZlibStreamDecoder',
+    'ZstdStreamDecoder',
+    'get_decoder',
+)
+
+ZLIB_SUFFIX = b'\x00\x00\xff\xff'
+
+
+class PayloadTooLarge(Exception):
+    """Raised by a decoder when a message goes over one of its size caps.
+
+    The stream can't be trusted past this point, so the connection has to
+    be dropped and the decoder reset.
+    """
+
+
+class ZlibStreamDecoder:
+    """Inflates a ``zlib-stream`` gateway connection.
+
+    Frames are fed in with :meth:`feed`, which returns the inflated message
+    once a frame ends with the zlib flush suffix and ``None`` otherwise.
+
+    A message that fits in a single frame (nearly all of them) is inflated
+    straight from the frame. Messages split over several frames are
+    gathered in a buffer that's allocated once and reused, only growing
+    when a message doesn't fit.
+
+    ``max_message_size`` caps the inflated size of one message and
+    ``max_buffer_size`` caps how much compressed data can pile up waiting
+    for the end of a message. Going over either raises
+    :exc:`PayloadTooLarge`; output is inflated incrementally, so a
+    message is never inflated past the cap.
+
+    Decoders are swappable, anything with ``feed``, ``reset`` and a
+    ``compress`` naming the gateway's compression mode will do.
+    """
+
+    compress = 'zlib-stream'
+
+    def __init__(
+        self,
+        *,
+        max_message_size: int = 64 * 1024 * 1024,
+        max_buffer_size: int = 16 * 1024 * 1024,
+        initial_size: int = 64 * 1024,
+    ):
+        self.max_message_size: int = max_message_size
+        self.max_buffer_size: int = max_buffer_size
+
+        self._buffer = bytearray(initial_size)
+        self._length: int = 0
+        self._inflator = zlib.decompressobj()
+
+    def reset(self) -> None:
+        """Starts over for a new connection, keeping the buffer."""
+        self._length = 0
+        self._inflator = zlib.decompressobj()
+
+    def _append(self, data) -> None:
+        end = self._length + len(data)
+        if end > self.max_buffer_size:
+            raise PayloadTooLarge(f"more than {self.max_buffer_size} bytes buffered without a complete message")
+
+        if end > len(self._buffer):
+            self._buffer.extend(bytes(max(end, len(self._buffer) * 2) - len(self._buffer)))
+        self._buffer[self._length:end] = data
+        self._length = end
+
+    def _inflate(self, data) -> bytes:
+        # ask for one byte over the cap so going over it is noticeable
+        out = self._inflator.decompress(data, self.max_message_size + 1)
+        if len(out) > self.max_message_size or self._inflator.unconsumed_tail:
+            raise PayloadTooLarge(f"message inflates to more than {self.max_message_size} bytes")
+        return out
+
+    def feed(self, data) -> Optional[bytes]:
+        # endswith compares in place, no slice gets made
+        if data.endswith(ZLIB_SUFFIX):
+            if not self._length:
+                return self._inflate(data)
+            self._append(data)
+        else:
+            self._append(data)
+            if len(data) >= 4:
+                # the suffix would have been in this frame
+                return None
+
+        with memoryview(self._buffer) as view, view[:self._length] as message:
+            # a tiny frame may end a suffix the frame before it started
+            if message[-4:] != ZLIB_SUFFIX:
+                return None
+
+            self._length = 0
+            return self._inflate(message)
+
+
+class ZstdStreamDecoder:
+    """Decompresses a ``zstd-stream`` gateway connection.
+
+    Needs the ``zstandard`` module. The whole connection is one zstd
+    stream and the gateway flushes it after every message, so each frame
+    holds exactly one message and there's nothing to buffer.
+
+    zstandard can't stop part way through a flush, so ``max_message_size``
+    is checked once a message is out rather than while inflating it.
+    """
+
+    compress = 'zstd-stream'
+
+    def __init__(self, *, max_message_size: int = 64 * 1024 * 1024):
+        if zstandard is None:
+            raise RuntimeError("zstd-stream compression needs the zstandard module")
+
+        self.max_message_size: int = max_message_size
+        self._context = zstandard.ZstdDecompressor()
+        self._decompressor = self._context.decompressobj()
+
+    def reset(self) -> None:
+        self._decompressor = self._context.decompressobj()
+
+    def feed(self, data) -> Optional[bytes]:
+        out = self._decompressor.decompress(data)
+        if len(out) > self.max_message_size:
+            raise PayloadTooLarge(f"message inflates to more than {self.max_message_size} bytes")
+        return out or None
+
+
+DECODERS = {
+    'zlib-stream': ZlibStreamDecoder,
+    'zstd-stream': ZstdStreamDecoder,
+}
+
+
+def get_decoder(compress: str = 'zlib-stream', **kwargs):
+    """Makes a decoder for a gateway compression mode.
+
+    ``zstd-stream`` falls back to ``zlib-stream`` when zstandard isn't
+    installed, so check the returned decoder's ``compress`` for the mode
+    that's actually in use.
+    """
+    if compress not in DECODERS:
+        raise ValueError(f"unknown gateway compression {compress!r}, expected one of {', '.join(DECODERS)}")
+
+    if compress == 'zstd-stream' and zstandard is None:
+        compress = 'zlib-stream'
+    return DECODERS[compress](**kwargs)
@@ -0,0 +1,229 @@
+"""
+MIT License
+
+Copyright (c) 2021-present Qwire Development Team
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Erlang's external term format, which the gateway speaks with encoding=etf.
+# Only the terms the gateway actually uses are supported.
+#
+# This is pure Python and decodes about 15 times slower than orjson (7 times
+# slower than the stdlib json) on benchmarks/payloads. erlpack is no quicker
+# and hands back atoms that orjson won't encode, so it isn't used either.
+
+import struct
+import zlib
+
+__all__ = (
+    'to_etf',
+    'from_etf',
+)
+
+VERSION = 131
+
+NEW_FLOAT_EXT = 70
+COMPRESSED = 80
+SMALL_INTEGER_EXT = 97
+INTEGER_EXT = 98
+FLOAT_EXT = 99
+ATOM_EXT = 100
+SMALL_TUPLE_EXT = 104
+LARGE_TUPLE_EXT = 105
+NIL_EXT = 106
+STRING_EXT = 107
+LIST_EXT = 108
+BINARY_EXT = 109
+SMALL_BIG_EXT = 110
+LARGE_BIG_EXT = 111
+MAP_EXT = 116
+SMALL_ATOM_EXT = 115
+ATOM_UTF8_EXT = 118
+SMALL_ATOM_UTF8_EXT = 119
+
+_u16 = struct.Struct('>H').unpack_from
+_u32 = struct.Struct('>I').unpack_from
+_i32 = struct.Struct('>i').unpack_from
+_f64 = struct.Struct('>d').unpack_from
+
+# map keys are atoms, and the same few dozen come up over and over
+_atoms = {b'nil': None, b'true': True, b'false': False}
+
+
+def _atom(name: bytes):
+    try:
+        return _atoms[name]
+    except KeyError:
+        value = _atoms[name] = name.decode('utf-8')
+        return value
+
+
+def _decode(data, pos: int):
+    tag = data[pos]
+    pos += 1
+
+    if tag == BINARY_EXT:
+        length, = _u32(data, pos)
+        pos += 4
+        return str(data[pos:pos + length], 'utf-8'), pos + length
+
+    if tag == SMALL_INTEGER_EXT:
+        return data[pos], pos + 1
+
+    if tag == MAP_EXT:
+        arity, = _u32(data, pos)
+        pos += 4
+        result = {}
+        for _ in range(arity):
+            key, pos = _decode(data, pos)
+            result[key], pos = _decode(data, pos)
+        return result, pos
+
+    if tag == SMALL_ATOM_UTF8_EXT or tag == SMALL_ATOM_EXT:
+        length = data[pos]
+        pos += 1
+        return _atom(data[pos:pos + length]), pos + length
+
+    if tag == SMALL_BIG_EXT:
+        # snowflakes come through as these, straight into an int
+        length = data[pos]
+        sign = data[pos + 1]
+        pos += 2
+        value = int.from_bytes(data[pos:pos + length], 'little')
+        return (-value if sign else value), pos + length
+
+    if tag == LIST_EXT:
+        length, = _u32(data, pos)
+        pos += 4
+        result = []
+        for _ in range(length):
+            item, pos = _decode(data, pos)
+            result.append(item)
+        # proper lists end with an empty list
+        _, pos = _decode(data, pos)
+        return result, pos
+
+    if tag == NIL_EXT:
+        return [], pos
+
+    if tag == INTEGER_EXT:
+        return _i32(data, pos)[0], pos + 4
+
+    if tag == STRING_EXT:
+        # a list of small ints, not text
+        length, = _u16(data, pos)
+        pos += 2
+        return list(data[pos:pos + length]), pos + length
+
+    if tag == NEW_FLOAT_EXT:
+        return _f64(data, pos)[0], pos + 8
+
+    if tag == ATOM_UTF8_EXT or tag == ATOM_EXT:
+        length, = _u16(data, pos)
+        pos += 2
+        return _atom(data[pos:pos + length]), pos + length
+
+    if tag == LARGE_BIG_EXT:
+        length, = _u32(data, pos)
+        sign = data[pos + 4]
+        pos += 5
+        value = int.from_bytes(data[pos:pos + length], 'little')
+        return (-value if sign else value), pos + length
+
+    if tag == SMALL_TUPLE_EXT or tag == LARGE_TUPLE_EXT:
+        if tag == SMALL_TUPLE_EXT:
+            arity = data[pos]
+            pos += 1
+        else:
+            arity, = _u32(data, pos)
+            pos += 4
+        result = []
+        for _ in range(arity):
+            item, pos = _decode(data, pos)
+            result.append(item)
+        return tuple(result), pos
+
+    if tag == FLOAT_EXT:
+        return float(data[pos:pos + 31].rstrip(b'\x00')), pos + 31
+
+    raise ValueError(f"unsupported ETF tag {tag} at offset {pos - 1}")
+
+
+def from_etf(data):
+    """Decodes an ETF payload. Binaries come out as ``str`` and integers,
+    snowflakes included, as ``int``."""
+    # indexing bytes is quicker than going through a memoryview
+    if not isinstance(data, bytes):
+        data = bytes(data)
+
+    if data[0] != VERSION:
+        raise ValueError(f"not an ETF payload (version byte {data[0]})")
+
+    if data[1] == COMPRESSED:
+        return _decode(zlib.decompress(data[6:]), 0)[0]
+    return _decode(data, 1)[0]
+
+
+def _encode(obj, out: bytearray) -> None:
+    # bool first, it's an int subclass
+    if obj is None:
+        out += b'\x77\x03nil'
+    elif obj is True:
+        out += b'\x77\x04true'
+    elif obj is False:
+        out += b'\x77\x05false'
+    elif isinstance(obj, str):
+        encoded = obj.encode('utf-8')
+        out += struct.pack('>BI', BINARY_EXT, len(encoded))
+        out += encoded
+    elif isinstance(obj, int):
+        if 0 <= obj < 256:
+            out += struct.pack('>BB', SMALL_INTEGER_EXT, obj)
+        elif -2 ** 31 <= obj < 2 ** 31:
+            out += struct.pack('>Bi', INTEGER_EXT, obj)
+        else:
+            value = abs(obj)
+            encoded = value.to_bytes((value.bit_length() + 7) // 8, 'little')
+            out += struct.pack('>BBB', SMALL_BIG_EXT, len(encoded), obj < 0)
+            out += encoded
+    elif isinstance(obj, float):
+        out += struct.pack('>Bd', NEW_FLOAT_EXT, obj)
+    elif isinstance(obj, dict):
+        out += struct.pack('>BI', MAP_EXT, len(obj))
+        for key, value in obj.items():
+            _encode(key, out)
+            _encode(value, out)
+    elif isinstance(obj, (list, tuple)):
+        if obj:
+            out += struct.pack('>BI', LIST_EXT, len(obj))
+            for item in obj:
+                _encode(item, out)
+        out.append(NIL_EXT)
+    elif isinstance(obj, (bytes, bytearray)):
+        out += struct.pack('>BI', BINARY_EXT, len(obj))
+        out += obj
+    else:
+        raise TypeError(f"can't encode {type(obj).__name__} as ETF")
+
+
+def to_etf(obj) -> bytes:
+    out = bytearray([VERSION])
+    _encode(obj, out)
+    return bytes(out)
@@ -22,6 +22,8 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import re
+
 try:
     import orjson
 
@@ -32,3 +34,51 @@ except ModuleNotFoundError:
 
     to_json = lambda o: json.dumps(o, separators=(',', ':'), ensure_ascii=True)
     from_json = json.loads
+
+
+# how the gateway starts every payload
+_HEADER = re.compile(rb'\{"t":(?:"([^"]*)"|null),"s":(\d+|null),"op":(\d+),"d":')
+# top level fields of a gateway payload, as they appear ahead of "d"
+_HEADER_FIELD = re.compile(rb'"(op|s|t)":\s*(null|-?\d+|"[^"]*")')
+
+
+def scan_header(raw):
+    """Reads ``op``, ``s`` and ``t`` out of a raw JSON payload without
+    decoding the rest of it.
+
+    The gateway puts ``d`` last, so only what comes before it is looked
+    at. Returns ``None`` when the fields aren't all there (the payload
+    is laid out differently, or isn't bytes), in which case it has to be
+    decoded in full.
+    """
+    if type(raw) is not bytes:
+        return None
+
+    # the gateway lays payloads out the same way every time
+    match = _HEADER.match(raw)
+    if match is not None:
+        event, sequence, op = match.groups()
+        return (
+            int(op),
+            None if sequence == b'null' else int(sequence),
+            event if event is None else event.decode('utf-8'),
+        )
+
+    end = raw.find(b'"d":')
+    if end == -1:
+        return None
+
+    fields = {}
+    for match in _HEADER_FIELD.finditer(raw, 0, end):
+        value = match.group(2)
+        if value == b'null':
+            value = None
+        elif value[0] == 34:  # "
+            value = value[1:-1].decode('utf-8')
+        else:
+            value = int(value)
+        fields[match.group(1)] = value
+
+    if len(fields) != 3:
+        return None
+    return fields[b'op'], fields[b's'], fields[b't']
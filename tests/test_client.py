@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from disno.http.client import Requester
+from disno.http.errors import DeadlineExceeded
+from disno.http.route import Route
+
+
+class FakeAPI:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.hits = 0
+
+    async def get_channel(self, request):
+        self.hits += 1
+        await asyncio.sleep(self.delay)
+        headers = {
+            "x-ratelimit-limit": "5",
+            "x-ratelimit-remaining": str(5 - self.hits),
+            "x-ratelimit-reset-after": "10",
+        }
+        return web.json_response({"id": request.match_info["channel_id"]}, headers=headers)
+
+
+async def serve(api: FakeAPI):
+    app = web.Application()
+    app.router.add_route("*", "/api/v9/channels/{channel_id}", api.get_channel)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/api/v9"
+
+
+def run_against(api: FakeAPI, test):
+    async def main():
+        runner, base = await serve(api)
+        Route.base, old_base = base, Route.base
+        try:
+            async with aiohttp.ClientSession() as session:
+                await test(Requester(session, bot_token="token"))
+        finally:
+            Route.base = old_base
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_timeout_after_sending_keeps_the_token():
+    api = FakeAPI(delay=0.3)
+
+    async def test(http):
+        route = Route("PATCH", "/channels/{channel_id}", channel_id=1)
+        with pytest.raises(DeadlineExceeded):
+            await http.request(route, payload={}, timeout=0.1)
+
+        await asyncio.sleep(0.3)
+        bucket = http.ratelimit_store.get_bucket(route.bucket)
+        assert api.hits == 1
+        # the server counted it, so the bucket mustn't have it back
+        assert bucket.remaining == 0
+        assert bucket.in_flight == 0
+
+    run_against(api, test)
+
+
+def test_shared_get_uses_each_callers_deadline():
+    api = FakeAPI(delay=0.3)
+
+    async def test(http):
+        route = lambda: Route("GET", "/channels/{channel_id}", channel_id=1)
+
+        async def hurried():
+            with http.time_limit(0.1):
+                return await http.request(route())
+
+        results = await asyncio.gather(hurried(), http.request(route()), return_exceptions=True)
+        assert isinstance(results[0], DeadlineExceeded)
+        assert results[1] == {"id": "1"}
+        assert api.hits == 1
+
+    run_against(api, test)
+
+
+def test_shared_get_is_cancelled_once_every_caller_gives_up():
+    api = FakeAPI(delay=0.3)
+
+    async def test(http):
+        route = lambda: Route("GET", "/channels/{channel_id}", channel_id=1)
+        callers = [asyncio.ensure_future(http.request(route())) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        shared = next(iter(http._inflight.values()))
+
+        callers[0].cancel()
+        await asyncio.sleep(0)
+        assert not shared.future.done()
+
+        callers[1].cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert shared.future.cancelled()
+        assert not http._inflight
+
+    run_against(api, test)
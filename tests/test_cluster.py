@@ -0,0 +1,71 @@
+import asyncio
+import os
+
+from disno.impl.cluster import FATAL_EXIT_CODE, ClusterLauncher
+
+
+class FakeProcess:
+    def __init__(self, exitcode=None):
+        self.exitcode = exitcode
+
+    def is_alive(self):
+        return self.exitcode is None
+
+    def terminate(self):
+        self.exitcode = -15
+
+
+def test_supervise_restarts_workers_independently():
+    async def main():
+        launcher = ClusterLauncher(None, "token", shard_count=3, cluster_count=3)
+        started = []
+        exitcodes = {0: FATAL_EXIT_CODE, 1: 1, 2: 1}
+
+        def start_worker(cluster_id):
+            started.append(cluster_id)
+            launcher.processes[cluster_id] = FakeProcess(exitcodes.pop(cluster_id, None))
+
+        launcher._start_worker = start_worker
+        for cluster_id in range(3):
+            start_worker(cluster_id)
+        # cluster 1 keeps dying, so it waits a long while before its restart
+        launcher.restarts[1] = 5
+
+        supervisor = asyncio.ensure_future(launcher._supervise())
+        await asyncio.sleep(3.5)
+
+        # 0 was shut out by the gateway, 2 came back while 1 is still waiting
+        assert started == [0, 1, 2, 2]
+        assert 0 not in launcher.processes
+        assert list(launcher._restarting) == [1]
+
+        launcher._closing = True
+        await asyncio.wait_for(supervisor, 2)
+
+    asyncio.run(main())
+
+
+def test_default_ipc_path_is_private_and_removed():
+    async def main():
+        launcher = ClusterLauncher(None, "token", shard_count=1)
+        launcher._start_worker = lambda cluster_id: None
+        launcher._closing = True
+
+        paths = []
+        original = asyncio.start_unix_server
+
+        async def start_unix_server(handler, path):
+            paths.append(path)
+            assert os.stat(os.path.dirname(path)).st_mode & 0o077 == 0
+            return await original(handler, path=path)
+
+        asyncio.start_unix_server = start_unix_server
+        try:
+            await launcher.start()
+        finally:
+            asyncio.start_unix_server = original
+
+        assert not os.path.exists(os.path.dirname(paths[0]))
+        assert launcher.ipc_path is None
+
+    asyncio.run(main())
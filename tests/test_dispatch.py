@@ -0,0 +1,49 @@
+import asyncio
+
+from disno.impl.dispatch import EventDispatcher
+
+
+def test_backlog_is_capped():
+    async def main():
+        dispatcher = EventDispatcher(max_concurrency=2, high_water=4, max_backlog=10)
+        release = asyncio.Event()
+        handled = []
+
+        async def listener(data):
+            await release.wait()
+            handled.append(data["n"])
+
+        for n in range(100):
+            event = "MESSAGE_CREATE" if n % 2 else "TYPING_START"
+            await dispatcher.dispatch(event, {"channel_id": str(n % 3), "n": n}, [listener])
+            assert dispatcher.backlog <= 10
+
+        assert dispatcher.pending == 4
+        assert dispatcher.backlog == 10
+        assert dispatcher.dropped == 100 - 4 - 10
+        assert sum(dispatcher.dropped_events.values()) == dispatcher.dropped
+
+        release.set()
+        await asyncio.wait_for(dispatcher.join(), 1)
+        # the first ones started, then the newest ones that were waiting
+        assert sorted(handled) == list(range(4)) + list(range(90, 100))
+
+    asyncio.run(main())
+
+
+def test_same_key_keeps_order():
+    async def main():
+        dispatcher = EventDispatcher(max_concurrency=4, high_water=5)
+        handled = []
+
+        async def listener(data):
+            await asyncio.sleep(0.001)
+            handled.append(data["n"])
+
+        for n in range(30):
+            await dispatcher.dispatch("MESSAGE_CREATE", {"channel_id": "1", "n": n}, [listener])
+        await asyncio.wait_for(dispatcher.join(), 1)
+        assert handled == list(range(30))
+        assert dispatcher.dropped == 0
+
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+import time
+
+from disno.impl.messages import MessageCache
+from disno.impl.policy import EntityPolicy
+
+
+def test_expired_message_isnt_kept_weakly():
+    cache = MessageCache(EntityPolicy(max_size=10, ttl=60, weak=True))
+    cache.store({"id": "1", "channel_id": "10", "content": "hi"})
+    # held onto elsewhere, which would keep a weak entry alive
+    message = cache.get(10, 1)
+    assert message["content"] == "hi"
+
+    entry = cache.channels[10].get(1)
+    cache.channels[10].replace(1, (entry[0], entry[1], time.monotonic() - 61))
+
+    assert cache.get(10, 1) is None
+    assert cache.get(10, 1) is None
+    assert 1 not in cache._weak
+    assert cache.size == 0
+    assert not cache.channels
+
+
+def test_evicted_message_is_kept_weakly():
+    cache = MessageCache(EntityPolicy(max_size=1, ttl=60, weak=True))
+    cache.store({"id": "1", "channel_id": "10", "content": "hi"})
+    message = cache.get(10, 1)
+    cache.store({"id": "2", "channel_id": "10", "content": "there"})
+
+    assert cache.get(10, 1) is message
@@ -0,0 +1,165 @@
+"""Several processes sharing one bot token through a RateLimitBroker,
+against a fake API that answers with a 429 whenever a limit is broken."""
+
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from disno.http.broker import RateLimitBroker, BrokerRateLimitStore
+from disno.http.errors import RateLimitBrokerError
+from disno.http.client import Requester
+from disno.http.route import Route
+
+WORKERS = 4
+REQUESTS = 8
+BUCKET_LIMIT = 5
+BUCKET_WINDOW = 0.5
+GLOBAL_LIMIT = 50
+CHANNEL_ID = 1234
+
+
+class FakeAPI:
+    """One bucket of ``BUCKET_LIMIT`` requests per ``BUCKET_WINDOW``
+    seconds and the global ``GLOBAL_LIMIT`` per second."""
+
+    def __init__(self):
+        self.window_start = None
+        self.window_count = 0
+        self.global_times = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.served = 0
+        self.rejected = 0
+
+    async def create_message(self, request):
+        now = time.monotonic()
+        if self.window_start is None or now - self.window_start >= BUCKET_WINDOW:
+            self.window_start = now
+            self.window_count = 0
+
+        self.global_times = [t for t in self.global_times if now - t < 1.0]
+        reset_after = BUCKET_WINDOW - (now - self.window_start)
+        headers = {
+            "x-ratelimit-bucket": "abcd",
+            "x-ratelimit-limit": str(BUCKET_LIMIT),
+            "x-ratelimit-reset-after": f"{reset_after:.3f}",
+            "via": "1.1 google",
+        }
+
+        if self.window_count >= BUCKET_LIMIT or len(self.global_times) >= GLOBAL_LIMIT:
+            self.rejected += 1
+            headers["x-ratelimit-remaining"] = "0"
+            body = {"message": "You are being rate limited.", "retry_after": reset_after, "global": False}
+            return web.json_response(body, status=429, headers=headers)
+
+        self.window_count += 1
+        self.global_times.append(now)
+        headers["x-ratelimit-remaining"] = str(BUCKET_LIMIT - self.window_count)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            self.in_flight -= 1
+
+        self.served += 1
+        return web.json_response({"id": str(self.served), "channel_id": request.match_info["channel_id"]}, headers=headers)
+
+
+def _worker(base: str, path: str, results) -> None:
+    async def main():
+        Route.base = base
+        store = BrokerRateLimitStore(path)
+        async with aiohttp.ClientSession() as session:
+            http = Requester(session, bot_token="token", ratelimit_store=store)
+            route = lambda: Route("POST", "/channels/{channel_id}/messages", channel_id=CHANNEL_ID)
+            await asyncio.gather(*(http.request(route(), payload={"content": "hi"}) for _ in range(REQUESTS)))
+        await store.close()
+        results.put(http.received_429s)
+
+    asyncio.run(main())
+
+
+async def _run(path: str):
+    api = FakeAPI()
+    app = web.Application()
+    app.router.add_post("/api/v9/channels/{channel_id}/messages", api.create_message)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    broker = RateLimitBroker(path)
+    await broker.start()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(f"http://127.0.0.1:{port}/api/v9", path, results))
+        for _ in range(WORKERS)
+    ]
+    loop = asyncio.get_running_loop()
+    try:
+        for process in processes:
+            process.start()
+        for process in processes:
+            await loop.run_in_executor(None, process.join, 60)
+        received = [results.get(timeout=5) for _ in processes]
+        assert [process.exitcode for process in processes] == [0] * WORKERS
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.kill()
+        await broker.close()
+        await runner.cleanup()
+
+    return api, received
+
+
+def test_processes_share_limits():
+    with tempfile.TemporaryDirectory() as directory:
+        api, received = asyncio.run(_run(os.path.join(directory, "broker.sock")))
+
+    assert api.served == WORKERS * REQUESTS
+    assert api.rejected == 0
+    assert received == [0] * WORKERS
+    assert api.max_in_flight <= BUCKET_LIMIT
+
+
+async def _errors(path: str):
+    broker = RateLimitBroker(path)
+    await broker.start()
+    store = BrokerRateLimitStore(path)
+    try:
+        # releasing a token that was never taken is a no-op
+        await asyncio.wait_for(store.release("never-acquired"), 1)
+
+        # a call that fails in the broker fails the caller instead of
+        # leaving it waiting for a reply
+        with pytest.raises(RateLimitBrokerError):
+            await asyncio.wait_for(store._call("no-such-op", key="k"), 1)
+        with pytest.raises(RateLimitBrokerError):
+            await asyncio.wait_for(store._call("update", key="k", headers={"x-ratelimit-limit": "many"}), 1)
+
+        # and the connection still works afterwards
+        assert await asyncio.wait_for(store.acquire("k"), 1) is False
+        await asyncio.wait_for(store.release("k"), 1)
+        await asyncio.wait_for(store.release("k"), 1)
+        assert broker.store.get_bucket("k").in_flight == 0
+    finally:
+        await store.close()
+        await broker.close()
+
+
+def test_broker_errors_are_replied_to():
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(_errors(os.path.join(directory, "broker.sock")))
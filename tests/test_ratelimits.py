@@ -0,0 +1,47 @@
+import asyncio
+
+from disno.http.enums import Priority
+from disno.http.ratelimits import MemoryRateLimitStore
+
+
+def headers(limit, remaining, reset_after):
+    return {
+        "x-ratelimit-limit": str(limit),
+        "x-ratelimit-remaining": str(remaining),
+        "x-ratelimit-reset-after": str(reset_after),
+    }
+
+
+def test_alias_moves_waiters_to_shared_bucket():
+    async def main():
+        store = MemoryRateLimitStore()
+
+        # route a learns its limits and becomes bucket x
+        await store.acquire("a")
+        await store.alias("a", "x")
+        await store.update("a", headers(2, 1, 0.2))
+        await store.release("a")
+
+        # route b is still discovering its limits, with a request in
+        # flight and two more waiting on its own bucket
+        await store.acquire("b")
+        waiters = [asyncio.ensure_future(store.acquire("b", Priority.user)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert not any(waiter.done() for waiter in waiters)
+
+        await store.alias("b", "x")
+        shared = store.get_bucket("x")
+        assert store.get_bucket("b") is shared
+        # b's request in flight, plus one waiter on x's remaining token
+        await asyncio.sleep(0)
+        assert shared.in_flight == 2
+        assert sum(waiter.done() for waiter in waiters) == 1
+        assert shared.in_flight <= shared.limit
+
+        await store.update("b", headers(2, 0, 0.05))
+        await store.release("b")
+        await store.release("b")
+        await asyncio.wait_for(asyncio.gather(*waiters), 1)
+        assert shared.in_flight == 1
+
+    asyncio.run(main())